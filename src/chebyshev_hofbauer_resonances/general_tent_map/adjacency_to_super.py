@@ -1,6 +1,8 @@
 import numpy as np
 
-from .operator_approx import cheb_op_ap
+from .hofbauer_tower import HofbauerTower
+from .operator_approx import cheb_op_ap, cheb_op_ap_pullback
+from .transfer_operator import PullbackOperator, reflection_signs
 
 """
 Old code repeated.
@@ -22,8 +24,9 @@ def generate_opp_approx(i, j, domains, generate, L, N, K, depth):
         The list of domains.
     generate : bool
         Whether to generate the operator approximation.
-    L : function
-        The operator to approximate.
+    L : function or PullbackOperator
+        The operator to approximate. A PullbackOperator reuses its stored
+        pullback table for the final domain.
     K : integer
         The order of the Chebyshev nodes, taken to be the order of the DCT.
     N : integer
@@ -41,6 +44,13 @@ def generate_opp_approx(i, j, domains, generate, L, N, K, depth):
         final_domain = domains[i]
         initial_domain = domains[j]
 
+        if isinstance(L, PullbackOperator) and depth == 1:
+            preimages, weights = L.pullback_table(final_domain, K)
+            L_hat_T = cheb_op_ap_pullback(
+                preimages, weights, N, initial_domain=initial_domain, nodes=L.nodes
+            )
+            return L_hat_T.T
+
         # Pass depth to cheb_op_ap
         L_hat_T = cheb_op_ap(
             L,
@@ -94,3 +104,96 @@ def create_partial_super_adjacency(adjacency_matrix, domains, L, N, K, depth):
     super_adjacency = np.block(super_adjacency.tolist())
 
     return super_adjacency
+
+
+def tower_edges(adj_matrices):
+    """
+    List the nonzero blocks of the super adjacency matrix.
+
+    Parameters
+    ----------
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+
+    Returns
+    -------
+    rows : ndarray
+        The row (final domain) index of each nonzero block, in increasing order.
+    cols : ndarray
+        The column (initial domain) index of each nonzero block.
+    """
+    if isinstance(adj_matrices, HofbauerTower):
+        _, sources, targets = adj_matrices.edge_list()
+        edges = np.unique(np.column_stack([targets, sources]), axis=0)
+        return edges[:, 0], edges[:, 1]
+
+    combined = np.sum([adj_matrix != 0 for adj_matrix in adj_matrices], axis=0)
+    rows, cols = np.nonzero(combined)
+    return rows, cols
+
+
+def has_edge(adj_matrices, branch, i, j):
+    """
+    Return whether domain j maps onto domain i under a branch.
+
+    Parameters
+    ----------
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+    branch : int
+        The branch.
+    i : int
+        The final domain.
+    j : int
+        The initial domain.
+    """
+    if isinstance(adj_matrices, HofbauerTower):
+        return bool(np.any(adj_matrices.targets(branch, j) == i))
+    return bool(adj_matrices[branch][i, j])
+
+
+def generate_block(i, j, domains, adj_matrices, transfer_operators, N, K):
+    """
+    Generate the i, j block of the super adjacency matrix summed over all branches.
+
+    If the initial domain is symmetric about 1/2, the block of a branch that is the
+    reflection of an earlier branch (see `ReflectedPullbackOperator`) is the block of
+    its partner with the sign pattern (-1)^n on its columns, and is not recomputed.
+
+    Parameters
+    ----------
+    i : int
+        The row index of the adjacency matrices.
+    j : int
+        The column index of the adjacency matrices.
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+    transfer_operators : list
+        The list of transfer operators, one for each branch.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+
+    Returns
+    -------
+    block : ndarray
+        The K x N block.
+    """
+    start, end = domains[j]
+    symmetric_domain = np.isclose(start + end, 1)
+
+    block = np.zeros((K, N))
+    computed = {}
+    for branch, L in enumerate(transfer_operators):
+        if not has_edge(adj_matrices, branch, i, j):
+            continue
+        partner = getattr(L, "partner", None)
+        if symmetric_domain and id(partner) in computed:
+            block += computed[id(partner)] * reflection_signs(N)
+        else:
+            computed[id(L)] = generate_opp_approx(i, j, domains, True, L, N, K, 1)
+            block += computed[id(L)]
+    return block
@@ -2,15 +2,47 @@ import numpy as np
 
 from chebyshev_hofbauer_resonances.general_tent_map.adjacency_to_super import (
     create_partial_super_adjacency,
+    generate_block,
+    has_edge,
+    tower_edges,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.branch_inverses import (
+    synthesize_branches,
 )
 from chebyshev_hofbauer_resonances.general_tent_map.hofbauer_tower import (
-    create_adjacency_matricies,
+    create_hofbauer_tower,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.low_rank import (
+    create_low_rank_super_adjacency,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.matrix_free import (
+    MatrixFreeSuperAdjacency,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.memory_planner import (
+    estimate_rank_fraction,
+    plan_tower,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.out_of_core import (
+    create_super_adjacency_out_of_core,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.parallel_assembly import (
+    create_super_adjacency_parallel,
+)
+from chebyshev_hofbauer_resonances.general_tent_map.transfer_operator import (
+    PullbackOperator,
+    ReflectedPullbackOperator,
+    find_reflection_pairs,
 )
 
-from chebyshev_hofbauer_resonances.general_tent_map.ulams_method import ulams_method
+from chebyshev_hofbauer_resonances.general_tent_map.ulams_method import (
+    adaptive_ulams_method,
+    ulams_method,
+)
 
 
-def construct_transfer_operators(inverses, derivatives):
+def construct_transfer_operators(
+    inverses, derivatives, reflection_pairs=None, nodes="first"
+):
     """
     Constructs the transfer operator for each "segemnt" of the piecewise function.
 
@@ -20,18 +52,33 @@ def construct_transfer_operators(inverses, derivatives):
         The list of inverse functions for each segment.
     derivatives : list
         The list of derivative functions for each segment.
+    reflection_pairs : dict, optional
+        Maps the index of a segment to the index of an earlier segment it is the
+        reflection x -> 1 - x of (see `find_reflection_pairs`). The operators of
+        these segments are derived from their partner. Default is None.
+    nodes : str, optional
+        The kind of Chebyshev nodes the operators sample at, "first" or "second"
+        (see `PullbackOperator`). Default is "first".
 
     Returns
     -------
     transfer_operators : list
-        The list of transfer operator functions for each segment.
+        The list of transfer operators for each segment. Each is callable on a
+        function and stores its pullback tables for reuse across blocks.
     """
 
-    return [
-        lambda phi, i=i: lambda x: phi(inverses[i](x))
-        / abs(derivatives[i](inverses[i](x)))
-        for i in range(len(inverses))
-    ]
+    if reflection_pairs is None:
+        reflection_pairs = {}
+
+    transfer_operators = []
+    for m, (inverse, derivative) in enumerate(zip(inverses, derivatives)):
+        if m in reflection_pairs:
+            partner = transfer_operators[reflection_pairs[m]]
+            transfer_operators.append(ReflectedPullbackOperator(partner))
+        else:
+            transfer_operators.append(PullbackOperator(inverse, derivative, nodes))
+
+    return transfer_operators
 
 
 def create_super_adjacency(domains, adj_matrices, transfer_operators, N, K, depth):
@@ -42,8 +89,8 @@ def create_super_adjacency(domains, adj_matrices, transfer_operators, N, K, dept
     ----------
     domains : list
         The list of domains.
-    adj_matrices : list
-        The list of adjacency matrices.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower if depth is 1.
     transfer_operators : list
         The list of transfer operator functions.
     K : integer
@@ -57,6 +104,15 @@ def create_super_adjacency(domains, adj_matrices, transfer_operators, N, K, dept
     super_adjacency : ndarray
         The super adjacency matrix.
     """
+    if depth == 1:
+        n = len(domains)
+        super_adjacency = np.zeros((n * K, n * N))
+        for i, j in zip(*tower_edges(adj_matrices)):
+            super_adjacency[i * K : (i + 1) * K, j * N : (j + 1) * N] = generate_block(
+                i, j, domains, adj_matrices, transfer_operators, N, K
+            )
+        return super_adjacency
+
     partial_super_adjacency = [
         create_partial_super_adjacency(
             adj_matrices[i], domains, transfer_operators[i], K, N, depth
@@ -69,8 +125,59 @@ def create_super_adjacency(domains, adj_matrices, transfer_operators, N, K, dept
     return super_adjacency
 
 
+def tower_transfer_operators(
+    function_domains, functions, inverses, derivatives, symmetric=False, nodes="first"
+):
+    """
+    Construct the transfer operators of a map, synthesising missing branches.
+
+    See `approx_super_adjacency` for the parameters.
+
+    Raises
+    ------
+    ValueError
+        If `symmetric` is True but a branch on the reflection of another branch's
+        domain is not the reflection of that branch.
+    """
+    if inverses is None or derivatives is None:
+        synthesized_inverses, synthesized_derivatives = synthesize_branches(
+            function_domains, functions
+        )
+        if inverses is None:
+            inverses = synthesized_inverses
+        if derivatives is None:
+            derivatives = synthesized_derivatives
+    if symmetric:
+        reflection_pairs = find_reflection_pairs(function_domains, functions)
+        mirrored = find_reflection_pairs(function_domains, functions, check=False)
+        if reflection_pairs != mirrored:
+            unpaired = sorted(set(mirrored.items()) - set(reflection_pairs.items()))
+            raise ValueError(
+                "The map is not reflection symmetric: branches (m, i) = "
+                f"{unpaired} have reflected domains but f_m(1 - x) != f_i(x)."
+            )
+    else:
+        reflection_pairs = {}
+    return construct_transfer_operators(
+        inverses, derivatives, reflection_pairs, nodes=nodes
+    )
+
+
 def approx_super_adjacency(
-    function_domains, functions, inverses, derivatives, N, K, depth
+    function_domains,
+    functions,
+    inverses,
+    derivatives,
+    N,
+    K,
+    depth,
+    processes=None,
+    return_domains=False,
+    symmetric=False,
+    low_rank_tol=None,
+    memory_budget=None,
+    directory=None,
+    nodes="first",
 ):
     """
     Create the super adjacency matrix approximation for the given piecewise function.
@@ -80,33 +187,191 @@ def approx_super_adjacency(
         The list of domains for each segment of the piecewise function.
     functions : list
         The list of functions for each segment of the piecewise function.
-    inverses : list
-        The list of inverse functions for each segment.
-    derivatives : list
-        The list of derivative functions for each segment.
+    inverses : list or None
+        The list of inverse functions for each segment. If None, the inverses are
+        computed from `functions` by vectorised root-finding.
+    derivatives : list or None
+        The list of derivative functions for each segment. If None, the derivatives
+        are computed from `functions` by Chebyshev differentiation.
     K : integer
         The order of the Chebyshev nodes, taken to be the order of the DCT.
     N : integer
         The order of the Chebyshev polynomials to use.
     depth : int
         The depth of the approximation.
+    processes : int, optional
+        If given, the blocks are assembled by this many worker processes into a
+        block sparse matrix (see `create_super_adjacency_parallel`). Default is None,
+        which assembles a dense matrix in the calling process.
+    return_domains : bool, optional
+        Whether to also return the domains of the Hofbauer tower. Default is False.
+    symmetric : bool, optional
+        Whether the map is reflection symmetric, f(1 - x) = f(x). If True, branches
+        on reflected domains derive their blocks from their partner, after the
+        functions are compared at sample points (see `find_reflection_pairs`);
+        ValueError is raised if they are not reflections. Default is False.
+    low_rank_tol : float, optional
+        If given, each block is truncated to low rank, discarding singular values
+        below this tolerance, and a LowRankSuperAdjacency is returned (see
+        `create_low_rank_super_adjacency`). Default is None.
+    memory_budget : float, optional
+        If given, the memory budget in bytes. The representation (dense, block sparse,
+        low rank if `low_rank_tol` is given, or matrix-free) is chosen by
+        `plan_tower` as the cheapest to solve that fits the budget, overriding
+        `processes`. Raises MemoryError if none fits. Default is None.
+    directory : str or Path, optional
+        If given, the matrix is written block row by block row to memory mapped
+        CSR files in this directory and returned as a MemmapCSR (see
+        `create_super_adjacency_out_of_core`). Takes precedence over the other
+        representations. Default is None.
+    nodes : str, optional
+        The kind of Chebyshev nodes the blocks are sampled at, "first" for the K
+        nodes cos(pi (2k + 1) / 2K) or "second" for the K + 1 nested nodes
+        cos(pi k / K), whose interpolant is truncated to K coefficients. Default is
+        "first". Second kind nodes need 1/|f'| to be finite at the tower domain
+        endpoints (see `PullbackOperator`). See also `progressive_super_adjacency`.
     Returns
     -------
-    super_adjacency : ndarray
+    super_adjacency : ndarray, bsr_matrix, LowRankSuperAdjacency,
+        MatrixFreeSuperAdjacency or MemmapCSR
         The super adjacency matrix approximation.
+    domains : list
+        The domains of the tower, in the block order of the matrix. Only returned
+        if `return_domains` is True.
     """
-    domains, adj_matrices = create_adjacency_matricies(
-        function_domains, functions, depth=depth
-    )
-    transfer_operators = construct_transfer_operators(inverses, derivatives)
-    super_adjacency = create_super_adjacency(
-        domains, adj_matrices, transfer_operators, N, K, 1
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    domains = tower.domains
+    transfer_operators = tower_transfer_operators(
+        function_domains, functions, inverses, derivatives, symmetric, nodes
     )
+    if memory_budget is not None:
+        rank_fraction = None
+        if low_rank_tol is not None:
+            rank_fraction = estimate_rank_fraction(
+                domains, tower, transfer_operators, N, K, tol=low_rank_tol
+            )
+        plan = plan_tower(
+            domains,
+            tower,
+            N,
+            K,
+            memory_budget,
+            rank_fraction=rank_fraction,
+            processes=1 if processes is None else processes,
+        )
+        representation = plan["representation"]
+        if representation != "low_rank":
+            low_rank_tol = None
+        if representation == "dense":
+            processes = None
+        elif representation == "sparse" and processes is None:
+            processes = 1
+    else:
+        representation = None
+
+    if directory is not None:
+        super_adjacency = create_super_adjacency_out_of_core(
+            domains, tower, transfer_operators, N, K, directory
+        )
+    elif representation == "matrix_free":
+        super_adjacency = MatrixFreeSuperAdjacency(
+            domains, tower, transfer_operators, N, K
+        )
+    elif low_rank_tol is not None:
+        super_adjacency = create_low_rank_super_adjacency(
+            domains, tower, transfer_operators, N, K, tol=low_rank_tol
+        )
+    elif processes is not None:
+        super_adjacency = create_super_adjacency_parallel(
+            domains, tower, transfer_operators, N, K, processes=processes
+        )
+    else:
+        super_adjacency = create_super_adjacency(
+            domains, tower, transfer_operators, N, K, 1
+        )
+
+    if return_domains:
+        return super_adjacency, domains
 
     return super_adjacency
 
 
-def approx_ulams(function_domains, functions, inverses, derivatives, N, M):
+def progressive_super_adjacency(
+    function_domains,
+    functions,
+    inverses,
+    derivatives,
+    Ns,
+    depth,
+    processes=None,
+    symmetric=False,
+    nodes="second",
+):
+    """
+    Create super adjacency matrices of increasing order on nested Chebyshev nodes.
+
+    The tower and the transfer operators are built once, and each pullback table
+    reuses the samples of the previous orders whose nodes are a subset of the new
+    ones (see `PullbackOperator`). With second kind nodes and Ns = (8, 16, 32, 64)
+    the branches are evaluated at 65 points per block row in total, the cost of the
+    final order alone; with first kind nodes the orders should triple instead, for
+    example Ns = (8, 24, 72). Being a generator, a convergence check can stop early.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    inverses : list or None
+        The list of inverse functions for each segment. If None, synthesised.
+    derivatives : list or None
+        The list of derivative functions for each segment. If None, synthesised.
+    Ns : iterable
+        The orders of the Chebyshev polynomials, with K = N, typically doubling.
+    depth : int
+        The depth of the approximation.
+    processes : int, optional
+        If given, each matrix is assembled by this many worker processes into a
+        block sparse matrix, with the pullback tables filled beforehand in the
+        calling process. Default is None, which assembles dense matrices.
+    symmetric : bool, optional
+        Whether the map is reflection symmetric (see `approx_super_adjacency`).
+        Default is False.
+    nodes : str, optional
+        The kind of Chebyshev nodes, "second" or "first" (see
+        `approx_super_adjacency`). Default is "second".
+
+    Yields
+    ------
+    N : int
+        The order of the matrix.
+    super_adjacency : ndarray or bsr_matrix
+        The super adjacency matrix of order N.
+    """
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    domains = tower.domains
+    transfer_operators = tower_transfer_operators(
+        function_domains, functions, inverses, derivatives, symmetric, nodes
+    )
+    rows, cols = tower_edges(tower)
+    for N in Ns:
+        if processes is not None:
+            # Fill the tables here, as tables filled by the workers are not kept.
+            for i, j in zip(rows, cols):
+                for branch, L in enumerate(transfer_operators):
+                    if has_edge(tower, branch, i, j):
+                        L.pullback_table(domains[i], N)
+            yield N, create_super_adjacency_parallel(
+                domains, tower, transfer_operators, N, N, processes=processes
+            )
+        else:
+            yield N, create_super_adjacency(domains, tower, transfer_operators, N, N, 1)
+
+
+def approx_ulams(
+    function_domains, functions, inverses, derivatives, N, M, directory=None
+):
     """
     Create the Ulam's method approximation for the given piecewise function.
     Parameters
@@ -123,11 +388,58 @@ def approx_ulams(function_domains, functions, inverses, derivatives, N, M):
         The number of Ulam bins.
     M : integer
         The number of samples per Ulam bin.
+    directory : str or Path, optional
+        If given, the matrix is built out of core in memory mapped files in this
+        directory. Default is None.
     Returns
     -------
-    L : ndarray
+    L : ndarray or MemmapCSR
         The Ulam's method approximation of the transfer operator.
     """
+    f = piecewise_function(function_domains, functions)
+
+    return ulams_method(N, M, f, directory=directory)
+
+
+def approx_ulams_adaptive(function_domains, functions, M, **kwargs):
+    """
+    Create the adaptive Ulam's method approximation for the given piecewise function.
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    M : integer
+        The number of samples per Ulam bin.
+    **kwargs
+        Further keyword arguments passed to `adaptive_ulams_method`.
+    Returns
+    -------
+    bins : ndarray
+        The bin edges of the final partition.
+    L : csr_matrix
+        The Ulam's method approximation of the transfer operator on the partition.
+    """
+    f = piecewise_function(function_domains, functions)
+
+    return adaptive_ulams_method(M, f, **kwargs)
+
+
+def piecewise_function(function_domains, functions):
+    """
+    Combine the segments of a piecewise function into one vectorised function.
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    Returns
+    -------
+    f : callable
+        The piecewise function, accepting and returning ndarrays.
+    """
 
     def f(x):
         for i, domain in enumerate(function_domains):
@@ -135,6 +447,4 @@ def approx_ulams(function_domains, functions, inverses, derivatives, N, M):
                 return functions[i](x)
         raise ValueError(f"x={x} is not in any domain")
 
-    f = np.vectorize(f)
-
-    return ulams_method(N, M, f)
+    return np.vectorize(f)
@@ -0,0 +1,196 @@
+import numpy as np
+from numpy.polynomial.chebyshev import chebvander
+from scipy.fftpack import dct
+from scipy.sparse import bsr_matrix
+
+from .adjacency_to_super import has_edge, tower_edges
+from .branch_inverses import chebyshev_derivative, invert_branch
+from .hofbauer_tower import HofbauerTower, create_hofbauer_tower
+from .operator_approx import chebyshev_nodes, inverse_linear_map, linear_map
+
+
+class BatchedSuperAdjacency:
+    """
+    Super adjacency matrices of several parameters sharing one tower structure.
+
+    All matrices have the same block sparsity pattern, stored once in `indices` and
+    `indptr`, and differ only in their block values `data`.
+
+    Parameters
+    ----------
+    alphas : ndarray
+        The P parameters of the batch.
+    domains : ndarray
+        Array of shape (P, n, 2) of the tower domains for each parameter.
+    data : ndarray
+        Array of shape (P, nnz, K, N) of the block values for each parameter.
+    indices : ndarray
+        The column (initial domain) index of each block.
+    indptr : ndarray
+        The BSR row pointer of the blocks.
+    """
+
+    def __init__(self, alphas, domains, data, indices, indptr):
+        self.alphas = alphas
+        self.domains = domains
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        _, n, _ = domains.shape
+        _, _, K, N = data.shape
+        self.shape = (n * K, n * N)
+
+    def __len__(self):
+        return len(self.alphas)
+
+    def __getitem__(self, p):
+        """
+        Return the super adjacency matrix of the p-th parameter as a bsr_matrix.
+        """
+        return bsr_matrix(
+            (self.data[p], self.indices, self.indptr), shape=self.shape, copy=False
+        )
+
+
+def tower_signature(adj_matrices):
+    """
+    Return a hashable key identifying the combinatorial structure of a tower.
+
+    Parameters
+    ----------
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+
+    Returns
+    -------
+    signature : tuple
+        The shape and nonzero pattern of the adjacency matrices.
+    """
+    if isinstance(adj_matrices, HofbauerTower):
+        shape = (adj_matrices.n_branches, len(adj_matrices))
+        edges = adj_matrices.edge_indptr.tobytes() + adj_matrices.edge_indices.tobytes()
+        return shape, edges
+
+    pattern = np.array([adj_matrix != 0 for adj_matrix in adj_matrices])
+    return pattern.shape, np.packbits(pattern).tobytes()
+
+
+def create_super_adjacency_batch(
+    function_domains, functions, domains, adj_matrices, N, K
+):
+    """
+    Compute the block values of a batch of super adjacency matrices at once.
+
+    Each branch is inverted on the Chebyshev nodes of a target domain for every
+    parameter in a single call, and the blocks of all parameters are evaluated and
+    transformed along a leading parameter axis.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of batched functions for each segment. Called on an array of shape
+        (P, M), each returns the values of the P maps of the batch row by row.
+    domains : ndarray
+        Array of shape (P, n, 2) of the tower domains for each parameter.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices shared by the batch, or the tower.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+
+    Returns
+    -------
+    data : ndarray
+        Array of shape (P, nnz, K, N) of block values, in the order of `tower_edges`.
+    """
+    rows, cols = tower_edges(adj_matrices)
+    nodes = chebyshev_nodes(K)
+    data = np.zeros((domains.shape[0], len(rows), K, N))
+
+    for branch, (function_domain, function) in enumerate(
+        zip(function_domains, functions)
+    ):
+        derivative = chebyshev_derivative(function, function_domain)
+        edges = np.array(
+            [has_edge(adj_matrices, branch, i, j) for i, j in zip(rows, cols)],
+            dtype=bool,
+        )
+        for i in np.unique(rows[edges]):
+            slots = np.nonzero((rows == i) & edges)[0]
+
+            final_domain = (domains[:, i, :1], domains[:, i, 1:])
+            x = linear_map(nodes, final_domain)
+            preimages = invert_branch(function, function_domain, x, derivative)
+            weights = 1 / np.abs(derivative(preimages))
+
+            for slot in slots:
+                j = cols[slot]
+                initial_domain = (domains[:, j, :1], domains[:, j, 1:])
+                basis = chebvander(inverse_linear_map(preimages, initial_domain), N - 1)
+                y = weights[..., None] * basis
+                L_hat = dct(y, type=2, axis=1) / K
+                L_hat[:, 0] = L_hat[:, 0] / 2
+                data[:, slot] += L_hat
+
+    return data
+
+
+def approx_super_adjacency_batch(map_family, alphas, N, K, depth):
+    """
+    Create the super adjacency matrix approximations for an array of parameters.
+
+    The parameters are grouped by the combinatorial structure of their Hofbauer
+    towers. Within a group the matrices share one sparsity pattern and their block
+    values are computed together (see `create_super_adjacency_batch`).
+
+    Parameters
+    ----------
+    map_family : callable
+        Function taking a parameter alpha and returning (function_domains, functions).
+        The function domains must not depend on alpha, and when alpha is an array of
+        shape (P, 1) the functions must broadcast over it.
+    alphas : ndarray
+        The parameters.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    depth : int
+        The depth of the approximation.
+
+    Returns
+    -------
+    batches : list
+        A BatchedSuperAdjacency for each group of parameters with the same tower
+        structure, in order of first appearance.
+    """
+    alphas = np.asarray(alphas, dtype=float)
+
+    groups = {}
+    for alpha in alphas:
+        function_domains, functions = map_family(alpha)
+        tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+        key = tower_signature(tower)
+        group = groups.setdefault(key, ([], [], tower))
+        group[0].append(alpha)
+        group[1].append(tower.domains)
+
+    batches = []
+    for group_alphas, group_domains, tower in groups.values():
+        group_alphas = np.array(group_alphas)
+        group_domains = np.array(group_domains, dtype=float)
+        function_domains, functions = map_family(group_alphas[:, None])
+
+        data = create_super_adjacency_batch(
+            function_domains, functions, group_domains, tower, N, K
+        )
+        rows, cols = tower_edges(tower)
+        indptr = np.searchsorted(rows, np.arange(len(tower) + 1))
+        batches.append(
+            BatchedSuperAdjacency(group_alphas, group_domains, data, cols, indptr)
+        )
+
+    return batches
@@ -0,0 +1,269 @@
+import argparse
+import tracemalloc
+
+import matplotlib.pyplot as plt
+import numpy as np
+from numpy.polynomial.polynomial import polyroots
+
+from .sweep import job_key, run_job
+
+
+def tent_reference_resonances(alpha, n_terms=400, radius=0.95):
+    """
+    Compute the resonances of the tent map from its kneading determinant.
+
+    The kneading determinant of x -> alpha min(x, 1 - x) is D(t) = sum_n theta_n t^n,
+    where theta_n = +-1 is the orientation of f^n along the orbit of the critical
+    point 1/2. Each zero t of D inside the unit disc gives a resonance 1 / (alpha t),
+    and t = 1 / alpha gives the eigenvalue 1. D is truncated after n_terms terms,
+    and only zeros with |t| < radius are kept, which the truncation leaves accurate
+    to machine precision for the default values.
+
+    Parameters
+    ----------
+    alpha : float
+        The slope, in (1, 2].
+    n_terms : int, optional
+        The number of terms of the kneading determinant. Default is 400.
+    radius : float, optional
+        The radius of the disc in which zeros are kept. Default is 0.95.
+
+    Returns
+    -------
+    resonances : ndarray
+        The resonances of modulus greater than 1 / (alpha radius), largest first.
+    """
+    c = 0.5
+    theta = np.ones(n_terms + 1)
+    for n in range(1, n_terms + 1):
+        c = alpha * min(c, 1 - c)
+        theta[n] = theta[n - 1] * (1 if c < 0.5 else -1)
+
+    zeros = polyroots(theta)
+    zeros = zeros[np.abs(zeros) < radius]
+    resonances = 1 / (alpha * zeros)
+    return resonances[np.argsort(-np.abs(resonances))]
+
+
+def resonance_error(eigenvalues, reference):
+    """
+    Return the largest distance from a reference resonance to the nearest eigenvalue.
+    """
+    eigenvalues = np.asarray(eigenvalues)
+    return float(
+        max(np.min(np.abs(eigenvalues - resonance)) for resonance in reference)
+    )
+
+
+def measure(function, *args, **kwargs):
+    """
+    Call a function and measure its peak Python heap allocation.
+
+    NumPy allocations are traced by tracemalloc, so the peak includes the arrays
+    built by the function.
+
+    Returns
+    -------
+    result
+        The return value of the function.
+    peak_memory : int
+        The peak number of bytes allocated during the call.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    try:
+        result = function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return result, peak - baseline
+
+
+def default_configurations():
+    """
+    Return a grid of super adjacency and Ulam's method configurations.
+    """
+    configurations = [
+        {"method": "approx_super_adjacency", "N": N, "depth": depth}
+        for N in (4, 8, 16, 24)
+        for depth in (5, 10, 20, 40)
+    ]
+    configurations += [
+        {"method": "approx_ulams", "N": N, "M": M}
+        for N in (250, 1000, 4000)
+        for M in (10, 50)
+    ]
+    return configurations
+
+
+def run_benchmark(alpha, configurations=None, n_reference=3, repeats=1):
+    """
+    Record the wall time, peak memory and error of each configuration on a tent map.
+
+    The error is measured against the leading `n_reference` resonances other than
+    1 from `tent_reference_resonances`. Times come from untraced runs, and the peak
+    memory from one further run under tracemalloc, whose overhead would otherwise
+    inflate the times of allocation heavy configurations.
+
+    Parameters
+    ----------
+    alpha : float
+        The slope of the tent map.
+    configurations : list, optional
+        Dictionaries with "method" ("approx_super_adjacency" or "approx_ulams"),
+        "N", and "depth" or "M". Default is `default_configurations()`.
+    n_reference : int, optional
+        The number of reference resonances. Default is 3.
+    repeats : int, optional
+        The number of timed runs of each configuration; the fastest time is kept.
+        Default is 1.
+
+    Returns
+    -------
+    records : list
+        The sweep records (see `run_job`) with the "error" and "memory" in bytes
+        added.
+    """
+    if configurations is None:
+        configurations = default_configurations()
+    reference = tent_reference_resonances(alpha)[1 : n_reference + 1]
+
+    records = []
+    for configuration in configurations:
+        job = {"map": "tent", "alpha": float(alpha), "k": 2 * n_reference + 4}
+        job.update(configuration)
+        job["key"] = job_key(job)
+
+        record = run_job(job)
+        for _ in range(repeats - 1):
+            record["time"] = min(record["time"], run_job(job)["time"])
+        _, memory = measure(run_job, job)
+
+        eigenvalues = [complex(*pair) for pair in record["eigenvalues"]]
+        record["error"] = resonance_error(eigenvalues, reference)
+        record["memory"] = memory
+        records.append(record)
+    return records
+
+
+def pareto_front(records, cost="time", error="error"):
+    """
+    Return the records not beaten on both cost and error by another, cheapest first.
+
+    Parameters
+    ----------
+    records : list
+        The benchmark records.
+    cost : str, optional
+        The cost key, "time" or "memory". Default is "time".
+    error : str, optional
+        The error key. Default is "error".
+
+    Returns
+    -------
+    front : list
+        The Pareto optimal records, by increasing cost and decreasing error.
+    """
+    front = []
+    for record in sorted(records, key=lambda record: (record[cost], record[error])):
+        if not front or record[error] < front[-1][error]:
+            front.append(record)
+    return front
+
+
+def cheapest_configuration(records, target_error, cost="time"):
+    """
+    Return the cheapest record with error at most target_error, or None.
+    """
+    feasible = [record for record in records if record["error"] <= target_error]
+    return min(feasible, key=lambda record: record[cost], default=None)
+
+
+def front_regressions(baseline, current, slowdown=1.5, cost="time"):
+    """
+    Compare the Pareto fronts of two benchmark runs.
+
+    For every point of the baseline front, the cheapest current configuration
+    reaching the same error is found. A regression is reported if there is none,
+    or if it costs more than `slowdown` times the baseline.
+
+    Parameters
+    ----------
+    baseline : list
+        The baseline benchmark records.
+    current : list
+        The current benchmark records.
+    slowdown : float, optional
+        The tolerated cost ratio. Default is 1.5.
+    cost : str, optional
+        The cost key, "time" or "memory". Default is "time".
+
+    Returns
+    -------
+    regressions : list
+        Tuples (baseline record, current record or None) of the regressions.
+    """
+    regressions = []
+    for record in pareto_front(baseline, cost):
+        match = cheapest_configuration(current, record["error"], cost)
+        if match is None or match[cost] > slowdown * record[cost]:
+            regressions.append((record, match))
+    return regressions
+
+
+def plot_pareto(records, cost="time", ax=None):
+    """
+    Plot error against cost for each method, with the Pareto front.
+
+    Parameters
+    ----------
+    records : list
+        The benchmark records.
+    cost : str, optional
+        The cost key, "time" or "memory". Default is "time".
+    ax : Axes, optional
+        The axes to plot on. Default is the current axes.
+
+    Returns
+    -------
+    ax : Axes
+        The axes.
+    """
+    if ax is None:
+        ax = plt.gca()
+    for method in sorted({record["method"] for record in records}):
+        points = [record for record in records if record["method"] == method]
+        ax.scatter(
+            [record[cost] for record in points],
+            [record["error"] for record in points],
+            label=method,
+        )
+    front = pareto_front(records, cost)
+    ax.step(
+        [record[cost] for record in front],
+        [record["error"] for record in front],
+        where="post",
+        color="k",
+        label="Pareto front",
+    )
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("wall time (s)" if cost == "time" else "peak memory (bytes)")
+    ax.set_ylabel("error")
+    ax.legend()
+    return ax
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark accuracy against cost.")
+    parser.add_argument("--alpha", type=float, default=1.8)
+    parser.add_argument("--cost", choices=("time", "memory"), default="time")
+    args = parser.parse_args()
+
+    records = run_benchmark(args.alpha)
+    for record in pareto_front(records, args.cost):
+        print(f"{record['key']}: {record[args.cost]:.3g} {record['error']:.3g}")
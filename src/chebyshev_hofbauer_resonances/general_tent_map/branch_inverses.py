@@ -0,0 +1,193 @@
+import numpy as np
+from numpy.polynomial.chebyshev import chebder, chebval
+
+from .operator_approx import (
+    chebyshev_coefficients,
+    chebyshev_nodes,
+    inverse_linear_map,
+    linear_map,
+)
+
+
+def chebyshev_derivative(function, function_domain, degree=32):
+    """
+    Compute the derivative of a branch by Chebyshev differentiation.
+
+    The branch is interpolated at Chebyshev points on its domain and the resulting
+    Chebyshev series is differentiated term by term.
+
+    The branch may be a batch of branches, returning an array of shape (P, M) when
+    called on M points. The derivative then expects arrays of shape (P, ...) and
+    differentiates each branch of the batch along its own row.
+
+    Parameters
+    ----------
+    function : callable
+        The branch function. Must accept and return ndarrays.
+    function_domain : tuple
+        Tuple (start, end) of the domain of the branch.
+    degree : int, optional
+        The degree of the Chebyshev interpolant. Default is 32.
+
+    Returns
+    -------
+    derivative : callable
+        Vectorised derivative of the branch on its domain.
+
+    Examples
+    --------
+    >>> derivative = chebyshev_derivative(lambda x: 1.2 * (1 - x), (0.5, 1))
+    >>> round(float(derivative(0.75)), 8)
+    -1.2
+    """
+    a, b = function_domain
+    x = linear_map(chebyshev_nodes(degree + 1), function_domain)
+    values = np.asarray(function(x), dtype=float)
+    values = np.broadcast_to(values, np.broadcast_shapes(values.shape, x.shape))
+
+    coefficients = chebyshev_coefficients(np.moveaxis(values, -1, 0))
+    coefficients = chebder(coefficients, scl=2 / (b - a))
+    if coefficients.ndim > 1:
+        coefficients = coefficients[..., None]
+
+    def derivative(x):
+        return chebval(inverse_linear_map(x, function_domain), coefficients, False)
+
+    return derivative
+
+
+def invert_branch(
+    function, function_domain, y, derivative=None, tol=1e-14, max_iter=100
+):
+    """
+    Invert a monotone branch on an array of values using safeguarded Newton iteration.
+
+    Every value is solved simultaneously. For a batch of branches (see
+    `chebyshev_derivative`), y has shape (P, M) and row p is inverted by branch p.
+    Each iterate keeps a bracket on the root, and a Newton step is replaced by
+    bisection whenever it leaves the bracket, so the iteration converges even when
+    the derivative is inaccurate or nearly zero.
+
+    Parameters
+    ----------
+    function : callable
+        The branch function. Must accept and return ndarrays.
+    function_domain : tuple
+        Tuple (start, end) of the domain of the branch, on which it is monotone.
+    y : ndarray
+        The values to invert.
+    derivative : callable, optional
+        The derivative of the branch. Default is the Chebyshev derivative.
+    tol : float, optional
+        The relative step size at which the iteration stops. Default is 1e-14.
+    max_iter : int, optional
+        The maximum number of iterations. Default is 100.
+
+    Returns
+    -------
+    x : ndarray
+        The preimages of y under the branch, clipped to the branch domain.
+    """
+    if derivative is None:
+        derivative = chebyshev_derivative(function, function_domain)
+
+    a, b = function_domain
+    y = np.asarray(y, dtype=float)
+    f_a, f_b = function(np.float64(a)), function(np.float64(b))
+    increasing = f_b > f_a
+
+    lo = np.full(y.shape, float(a))
+    hi = np.full(y.shape, float(b))
+    x = np.clip(a + (y - f_a) * (b - a) / (f_b - f_a), a, b)
+
+    for _ in range(max_iter):
+        residual = function(x) - y
+        above = (residual > 0) == increasing
+        hi = np.where(above, x, hi)
+        lo = np.where(above, lo, x)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_new = x - residual / derivative(x)
+        outside = ~np.isfinite(x_new) | (x_new < lo) | (x_new > hi)
+        x_new = np.where(outside, (lo + hi) / 2, x_new)
+
+        converged = np.abs(x_new - x) <= tol * (1 + np.abs(x))
+        x = x_new
+        if np.all(converged):
+            break
+
+    return x
+
+
+def synthesize_inverse(function, function_domain, derivative=None):
+    """
+    Construct a vectorised inverse of a branch that caches its results.
+
+    The inverse is solved with `invert_branch`. Results are cached on the node array
+    they were requested for, so a (branch, target domain) node set is only ever solved
+    once however many blocks it is reused in.
+
+    Parameters
+    ----------
+    function : callable
+        The branch function. Must accept and return ndarrays.
+    function_domain : tuple
+        Tuple (start, end) of the domain of the branch.
+    derivative : callable, optional
+        The derivative of the branch. Default is the Chebyshev derivative.
+
+    Returns
+    -------
+    inverse : callable
+        Vectorised inverse of the branch.
+    """
+    if derivative is None:
+        derivative = chebyshev_derivative(function, function_domain)
+
+    cache = {}
+
+    def inverse(y):
+        y = np.asarray(y, dtype=float)
+        key = (y.shape, y.tobytes())
+        if key not in cache:
+            cache[key] = invert_branch(function, function_domain, y, derivative)
+        return cache[key]
+
+    inverse.cache = cache
+
+    return inverse
+
+
+def synthesize_branches(function_domains, functions, degree=32):
+    """
+    Construct the inverse and derivative of each branch of a piecewise function.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+        Each function must accept and return ndarrays.
+    degree : int, optional
+        The degree of the Chebyshev interpolant used for differentiation. Default is 32.
+
+    Returns
+    -------
+    inverses : list
+        The list of cached, vectorised inverse functions for each segment.
+    derivatives : list
+        The list of vectorised derivative functions for each segment.
+    """
+    derivatives = [
+        chebyshev_derivative(function, domain, degree)
+        for domain, function in zip(function_domains, functions)
+    ]
+    inverses = [
+        synthesize_inverse(function, domain, derivative)
+        for domain, function, derivative in zip(
+            function_domains, functions, derivatives
+        )
+    ]
+
+    return inverses, derivatives
@@ -0,0 +1,160 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse.linalg import LinearOperator, eigs
+
+from .approx_transfer_op import approx_super_adjacency
+from .operator_approx import reexpand_chebyshev
+
+
+def project_eigenvectors(vectors, old_domains, new_domains, N):
+    """
+    Project tower eigenvectors onto the domains of a different tower.
+
+    Each new domain takes the Chebyshev series of the old domain with the nearest
+    endpoints, re-expanded on the new domain.
+
+    Parameters
+    ----------
+    vectors : ndarray
+        The eigenvectors as columns, N Chebyshev coefficients per old domain.
+    old_domains : list
+        The domains of the old tower.
+    new_domains : list
+        The domains of the new tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+
+    Returns
+    -------
+    projected : ndarray
+        The projected vectors as columns, N Chebyshev coefficients per new domain.
+    """
+    old_endpoints = np.array(old_domains, dtype=float)
+    blocks = vectors.reshape(len(old_domains), N, -1)
+
+    projected = []
+    for domain in new_domains:
+        distance = np.abs(old_endpoints - np.array(domain, dtype=float)).sum(axis=1)
+        nearest = int(np.argmin(distance))
+        projected.append(
+            reexpand_chebyshev(blocks[nearest], old_domains[nearest], domain, N)
+        )
+
+    return np.concatenate(projected, axis=0)
+
+
+def match_branches(previous, current):
+    """
+    Order eigenvalues to continue the branches of the previous step.
+
+    Parameters
+    ----------
+    previous : ndarray
+        The eigenvalues of the previous step.
+    current : ndarray
+        The eigenvalues of the current step.
+
+    Returns
+    -------
+    order : ndarray
+        Indices into current such that current[order][m] continues previous[m].
+    """
+    cost = np.abs(previous[:, None] - current[None, :])
+    _, order = linear_sum_assignment(cost)
+    return order
+
+
+def continue_resonances(
+    map_family, alphas, N, K, depth, k=6, processes=1, warm_start=True, **eigs_kwargs
+):
+    """
+    Track the leading resonances of a family of maps along a path of parameters.
+
+    At each parameter the super adjacency matrix is built with
+    `approx_super_adjacency` and its k largest eigenvalues are found by Arnoldi
+    iteration. The iteration is started from the eigenvectors of the previous step,
+    projected onto the new tower's domains, and the eigenvalues are ordered to
+    continue the branches of the previous step.
+
+    Parameters
+    ----------
+    map_family : callable
+        Function taking a parameter alpha and returning (function_domains, functions).
+    alphas : ndarray
+        The path of parameters.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    depth : int
+        The depth of the approximation.
+    k : int, optional
+        The number of resonances to track. Default is 6.
+    processes : int, optional
+        The number of processes used to assemble each operator. Default is 1.
+    warm_start : bool, optional
+        Whether to start each solve from the previous eigenvectors. Default is True.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    resonances : ndarray
+        Array of shape (len(alphas), k); column m follows one resonance branch.
+    matvecs : ndarray
+        The number of matrix-vector products used by each solve.
+    """
+    resonances = []
+    matvecs = []
+    previous = None
+
+    for alpha in alphas:
+        function_domains, functions = map_family(alpha)
+        super_adjacency, domains = approx_super_adjacency(
+            function_domains,
+            functions,
+            None,
+            None,
+            N,
+            K,
+            depth,
+            processes=processes,
+            return_domains=True,
+        )
+
+        count = [0]
+
+        def matvec(v):
+            count[0] += 1
+            return super_adjacency @ v
+
+        n = super_adjacency.shape[0]
+        operator = LinearOperator((n, n), matvec=matvec, dtype=float)
+
+        v0 = None
+        if warm_start and previous is not None:
+            old_values, old_vectors, old_domains = previous
+            projected = project_eigenvectors(old_vectors, old_domains, domains, N)
+            # Rotate each vector so its largest entry is real, then combine the real
+            # and imaginary parts with random weights, so neither the arbitrary
+            # phases nor a conjugate pair can cancel a vector out of the start.
+            largest = projected[np.argmax(np.abs(projected), axis=0), np.arange(k)]
+            projected = projected * np.exp(-1j * np.angle(largest))
+            weights = np.random.default_rng(0).standard_normal((2, k))
+            v0 = projected.real @ weights[0] + projected.imag @ weights[1]
+            if not np.any(v0):
+                v0 = None
+
+        values, vectors = eigs(operator, k=k, which="LM", v0=v0, **eigs_kwargs)
+
+        if previous is None:
+            order = np.argsort(-np.abs(values))
+        else:
+            order = match_branches(previous[0], values)
+        values, vectors = values[order], vectors[:, order]
+
+        resonances.append(values)
+        matvecs.append(count[0])
+        previous = (values, vectors, domains)
+
+    return np.array(resonances), np.array(matvecs)
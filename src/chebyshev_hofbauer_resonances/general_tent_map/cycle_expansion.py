@@ -0,0 +1,305 @@
+import numpy as np
+from numpy.polynomial.polynomial import polyroots
+
+from .branch_inverses import chebyshev_derivative, invert_branch
+from .hofbauer_tower import HofbauerTower, create_hofbauer_tower
+
+
+def tower_branch_edges(adj_matrices):
+    """
+    List the edges of the tower graph with the branch inducing each.
+
+    Parameters
+    ----------
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+
+    Returns
+    -------
+    sources : ndarray
+        The domain each edge starts from.
+    targets : ndarray
+        The domain each edge maps onto.
+    branches : ndarray
+        The branch of each edge.
+    """
+    if isinstance(adj_matrices, HofbauerTower):
+        branches, sources, targets = adj_matrices.edge_list()
+        return sources, targets, branches
+
+    sources, targets, branches = [], [], []
+    for b, adj_matrix in enumerate(adj_matrices):
+        i, j = np.nonzero(adj_matrix)
+        sources.append(j)
+        targets.append(i)
+        branches.append(np.full(len(i), b))
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(branches)
+
+
+def closed_walks(adj_matrices, n_max):
+    """
+    Enumerate the closed walks of the tower graph up to a given length.
+
+    Walks are grown one edge at a time from every domain, and those returning to
+    their starting domain are collected at each length.
+
+    Parameters
+    ----------
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+    n_max : int
+        The maximum length of the walks.
+
+    Returns
+    -------
+    walks : list
+        For n = 1, ..., n_max a tuple (nodes, branches) of arrays of shape
+        (W, n + 1) and (W, n): the domains visited and the branch of each step.
+    """
+    sources, targets, branches = tower_branch_edges(adj_matrices)
+    order = np.argsort(sources, kind="stable")
+    sources, targets, branches = sources[order], targets[order], branches[order]
+    if isinstance(adj_matrices, HofbauerTower):
+        n = len(adj_matrices)
+    else:
+        n = len(adj_matrices[0])
+    start = np.searchsorted(sources, np.arange(n + 1))
+
+    nodes = np.arange(n)[:, None]
+    steps = np.zeros((len(nodes), 0), dtype=int)
+    walks = []
+    for _ in range(n_max):
+        last = nodes[:, -1]
+        counts = start[last + 1] - start[last]
+        walk = np.repeat(np.arange(len(nodes)), counts)
+        edge = np.concatenate(
+            [np.arange(start[k], start[k + 1]) for k in last]
+            or [np.zeros(0, dtype=int)]
+        )
+        nodes = np.column_stack([nodes[walk], targets[edge]])
+        steps = np.column_stack([steps[walk], branches[edge]])
+
+        closed = nodes[:, 0] == nodes[:, -1]
+        walks.append((nodes[closed], steps[closed]))
+
+    return walks
+
+
+def solve_cycles(nodes, steps, domains, inverses, derivatives, tol=1e-14, max_iter=50):
+    """
+    Solve for the periodic points of many closed walks at once.
+
+    The periodic point of a walk is the fixed point of the composition of the
+    inverse branches along it, a contraction of its starting domain. It is found by
+    Newton's method on that composition, with the derivative accumulated along the
+    walk, for every walk simultaneously.
+
+    Parameters
+    ----------
+    nodes : ndarray
+        Array of shape (W, n + 1) of the domains visited by each walk.
+    steps : ndarray
+        Array of shape (W, n) of the branch of each step.
+    domains : list
+        The domains of the tower.
+    inverses : list
+        The list of vectorised inverse functions for each segment.
+    derivatives : list
+        The list of vectorised derivative functions for each segment.
+    tol : float, optional
+        The tolerance on the change of the periodic points. Default is 1e-14.
+    max_iter : int, optional
+        The maximum number of iterations. Default is 50.
+
+    Returns
+    -------
+    points : ndarray
+        The periodic point of each walk in its starting domain.
+    stabilities : ndarray
+        The derivative of the return map f^n at each periodic point.
+    """
+    x = np.array([np.mean(domains[k]) for k in nodes[:, 0]], dtype=float)
+    start = np.array([domains[k][0] for k in nodes[:, 0]], dtype=float)
+    end = np.array([domains[k][1] for k in nodes[:, 0]], dtype=float)
+
+    for _ in range(max_iter):
+        y = x
+        stabilities = np.ones_like(x)
+        for k in range(steps.shape[1] - 1, -1, -1):
+            y_next = np.empty_like(y)
+            for b, inverse in enumerate(inverses):
+                mask = steps[:, k] == b
+                if np.any(mask):
+                    y_next[mask] = inverse(y[mask])
+                    stabilities[mask] *= derivatives[b](y_next[mask])
+            y = y_next
+        step = (y - x) / (1 - 1 / stabilities)
+        x = np.clip(x + step, start, end)
+        if np.max(np.abs(step), initial=0) < tol:
+            break
+
+    return x, stabilities
+
+
+def cycle_traces(domains, adj_matrices, inverses, derivatives, n_max, kind="fredholm"):
+    """
+    Compute the cycle sums of a tower for every length up to n_max.
+
+    For kind "fredholm" these are the traces tr L^n, the sum over closed walks of
+    1 / |Lambda - 1| with Lambda the stability of the periodic orbit. For kind
+    "zeta" they are the sums of 1 / |Lambda| entering the dynamical zeta function.
+
+    Parameters
+    ----------
+    domains : list
+        The domains of the tower.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, one for each branch, or the tower.
+    inverses : list
+        The list of vectorised inverse functions for each segment.
+    derivatives : list
+        The list of vectorised derivative functions for each segment.
+    n_max : int
+        The maximum cycle length.
+    kind : str, optional
+        Either "fredholm" or "zeta". Default is "fredholm".
+
+    Returns
+    -------
+    traces : ndarray
+        The cycle sums for n = 1, ..., n_max.
+    """
+    if kind not in ("fredholm", "zeta"):
+        raise ValueError(f"Unknown kind {kind!r}, expected 'fredholm' or 'zeta'.")
+
+    traces = np.zeros(n_max)
+    for n, (nodes, steps) in enumerate(closed_walks(adj_matrices, n_max)):
+        if len(nodes) == 0:
+            continue
+        _, stabilities = solve_cycles(nodes, steps, domains, inverses, derivatives)
+        if kind == "fredholm":
+            traces[n] = np.sum(1 / np.abs(stabilities - 1))
+        else:
+            traces[n] = np.sum(1 / np.abs(stabilities))
+    return traces
+
+
+def cycle_expansion(traces):
+    """
+    Expand exp(-sum_n z^n tr_n / n) as a power series truncated at the cycle length.
+
+    Parameters
+    ----------
+    traces : ndarray
+        The cycle sums for n = 1, ..., n_max.
+
+    Returns
+    -------
+    coefficients : ndarray
+        The coefficients c_0, ..., c_{n_max} of the truncated series, lowest first.
+    """
+    n_max = len(traces)
+    coefficients = np.zeros(n_max + 1)
+    coefficients[0] = 1
+    for k in range(1, n_max + 1):
+        coefficients[k] = -np.dot(traces[:k], coefficients[k - 1 :: -1]) / k
+    return coefficients
+
+
+def cycle_expansion_resonances(
+    function_domains,
+    functions,
+    depth,
+    n_max,
+    inverses=None,
+    derivatives=None,
+    kind="fredholm",
+    tol=1e-2,
+):
+    """
+    Compute resonances as the inverse zeros of a truncated cycle expansion.
+
+    Periodic orbits are enumerated as closed walks of the Hofbauer tower graph and
+    solved through the branch inverses. The Fredholm determinant det(1 - z L) (or
+    the inverse dynamical zeta function) is expanded in cycle length up to n_max,
+    and its zeros z give the resonances 1 / z. The truncation at n_max - 1 is the
+    same series without its last term, and the distance from each resonance to the
+    nearest resonance of that truncation is returned as its error estimate. Only
+    resonances stable to `tol` are returned, as most zeros of a truncated series
+    are spurious.
+
+    The traces are exactly the traces tr A^n of the tower transfer operator, so the
+    only error is the truncation in n. It decays slowly: the tower operator has
+    many eigenvalues of modulus near 1 / |f'|, which keep the determinant
+    coefficients large. For the tent map at alpha 1.8 and depth 30, n_max = 14
+    gives the eigenvalue 1 to about 1e-3 and the first subleading pair to about
+    1e-2, and for n_max <= 10 no zero is stable to the default `tol`. The number
+    of closed walks grows with the topological entropy, so n_max is limited to
+    about 15, and the result is a rough estimate of the leading resonances rather
+    than a check of the super adjacency spectrum.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    depth : int
+        The depth of the tower.
+    n_max : int
+        The maximum cycle length.
+    inverses : list, optional
+        The list of inverse functions for each segment. Default is solved by
+        `invert_branch`.
+    derivatives : list, optional
+        The list of derivative functions for each segment. Default is the Chebyshev
+        derivative.
+    kind : str, optional
+        Either "fredholm" or "zeta". Default is "fredholm".
+    tol : float, optional
+        The largest error estimate, relative to the modulus of the resonance, of a
+        returned resonance. Default is 1e-2.
+
+    Returns
+    -------
+    resonances : ndarray
+        The stable resonances, largest modulus first.
+    errors : ndarray
+        Their error estimates.
+    """
+    if derivatives is None:
+        derivatives = [
+            chebyshev_derivative(function, domain)
+            for domain, function in zip(function_domains, functions)
+        ]
+    if inverses is None:
+        inverses = [
+            lambda y, f=function, d=domain, df=derivative: invert_branch(f, d, y, df)
+            for domain, function, derivative in zip(
+                function_domains, functions, derivatives
+            )
+        ]
+
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    traces = cycle_traces(tower.domains, tower, inverses, derivatives, n_max, kind)
+    coefficients = cycle_expansion(traces)
+
+    resonances = truncation_resonances(coefficients)
+    previous = truncation_resonances(coefficients[:-1])
+    if len(previous) == 0:
+        errors = np.full(len(resonances), np.inf)
+    else:
+        errors = np.abs(resonances[:, None] - previous[None, :]).min(axis=1)
+    stable = errors <= tol * np.abs(resonances)
+    order = np.argsort(-np.abs(resonances[stable]))
+    return resonances[stable][order], errors[stable][order]
+
+
+def truncation_resonances(coefficients):
+    """
+    Return the inverse zeros of a truncated series, dropping trailing zero terms.
+    """
+    coefficients = np.trim_zeros(coefficients, "b")
+    if len(coefficients) < 2:
+        return np.array([], dtype=complex)
+    return 1 / polyroots(coefficients).astype(complex)
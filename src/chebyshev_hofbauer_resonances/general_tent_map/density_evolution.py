@@ -0,0 +1,222 @@
+import numpy as np
+from numpy.polynomial.chebyshev import chebvander
+from numpy.polynomial.legendre import leggauss
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.linalg import eigs
+
+from .operator_approx import (
+    chebyshev_coefficients,
+    chebyshev_nodes,
+    inverse_linear_map,
+    linear_map,
+)
+
+
+def project_densities(densities, domains, N, base_domain=(0, 1)):
+    """
+    Project densities on the base interval onto tower coefficient vectors.
+
+    Each density is interpolated at the Chebyshev nodes of the base domain and
+    placed in that domain's block; every other block is zero.
+
+    Parameters
+    ----------
+    densities : list
+        Vectorised functions on the base domain.
+    domains : list
+        The domains of the tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    base_domain : tuple, optional
+        The domain the densities live on. Default is (0, 1).
+
+    Returns
+    -------
+    V : ndarray
+        Array of shape (len(domains) * N, len(densities)), one column per density.
+    """
+    base = domains.index(tuple(base_domain))
+    x = linear_map(chebyshev_nodes(N), base_domain)
+    values = np.column_stack([np.broadcast_to(rho(x), x.shape) for rho in densities])
+
+    V = np.zeros((len(domains) * N, len(densities)))
+    V[base * N : (base + 1) * N] = chebyshev_coefficients(values)
+    return V
+
+
+def evaluate_densities(V, domains, N, x):
+    """
+    Evaluate tower coefficient vectors as densities on the base interval.
+
+    The density at x is the sum of the Chebyshev series of every domain containing x.
+
+    Parameters
+    ----------
+    V : ndarray
+        Array of shape (len(domains) * N, m) of coefficient vectors.
+    domains : list
+        The domains of the tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    x : ndarray
+        The points to evaluate at.
+
+    Returns
+    -------
+    values : ndarray
+        Array of shape (len(x), m).
+    """
+    x = np.asarray(x, dtype=float)
+    V = V.reshape(len(domains), N, -1)
+    values = np.zeros((len(x), V.shape[-1]), dtype=V.dtype)
+    for block, domain in zip(V, domains):
+        inside = (x >= domain[0]) & (x <= domain[1])
+        if np.any(inside):
+            basis = chebvander(inverse_linear_map(x[inside], domain), N - 1)
+            values[inside] += basis @ block
+    return values
+
+
+def observable_weights(observables, domains, N, points=None):
+    """
+    Return the linear functionals integrating observables against tower densities.
+
+    Row g of the result, applied to a coefficient vector v, gives the integral of
+    observables[g] times the density of v over [0, 1]. Each domain is integrated
+    with Gauss-Legendre quadrature.
+
+    Parameters
+    ----------
+    observables : list
+        Vectorised functions on [0, 1].
+    domains : list
+        The domains of the tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    points : int, optional
+        The number of quadrature points per domain. Default is 2 N.
+
+    Returns
+    -------
+    W : ndarray
+        Array of shape (len(observables), len(domains) * N).
+    """
+    if points is None:
+        points = 2 * N
+    t, w = leggauss(points)
+    basis = chebvander(t, N - 1) * w[:, None]
+
+    W = np.zeros((len(observables), len(domains) * N))
+    for d, domain in enumerate(domains):
+        x = linear_map(t, domain)
+        scale = (domain[1] - domain[0]) / 2
+        for g, observable in enumerate(observables):
+            values = np.broadcast_to(observable(x), x.shape)
+            W[g, d * N : (d + 1) * N] = scale * (values @ basis)
+    return W
+
+
+def evolve_densities(super_adjacency, V, n_steps):
+    """
+    Apply the super adjacency matrix to many coefficient vectors repeatedly.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray, sparse matrix or LinearOperator
+        The super adjacency matrix.
+    V : ndarray
+        Array of shape (size, m) of coefficient vectors.
+    n_steps : int
+        The number of steps.
+
+    Yields
+    ------
+    V_n : ndarray
+        The vectors after n = 0, 1, ..., n_steps steps.
+    """
+    yield V
+    for _ in range(n_steps):
+        V = super_adjacency @ V
+        yield V
+
+
+def power_apply(super_adjacency, V, n):
+    """
+    Apply the n-th power of the super adjacency matrix by repeated squaring.
+
+    Uses about 2 log2(n) sparse matrix products, which is cheaper than n
+    matrix-vector products when n is large and the powers stay sparse.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix.
+    V : ndarray
+        Array of shape (size, m) of coefficient vectors.
+    n : int
+        The power.
+
+    Returns
+    -------
+    V_n : ndarray
+        The vectors after n steps.
+    """
+    if issparse(super_adjacency):
+        power = csr_matrix(super_adjacency)
+    else:
+        power = np.asarray(super_adjacency)
+    result = V
+    while n > 0:
+        if n & 1:
+            result = power @ result
+        n >>= 1
+        if n:
+            power = power @ power
+    return result
+
+
+def correlation_functions(
+    super_adjacency, domains, N, densities, observables, n_steps, centered=True
+):
+    """
+    Compute correlation functions for many densities and observables in one pass.
+
+    For each observable g and density rho, C(n) is the integral of g times L^n rho,
+    which equals the integral of (g o f^n) rho. If centered, the long-time limit
+    (integral of g h)(integral of rho), with h the invariant density, is subtracted
+    so that C(n) decays to zero.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray, sparse matrix or LinearOperator
+        The super adjacency matrix.
+    domains : list
+        The domains of the tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    densities : list
+        Vectorised densities on [0, 1].
+    observables : list
+        Vectorised observables on [0, 1].
+    n_steps : int
+        The number of steps.
+    centered : bool, optional
+        Whether to subtract the long-time limit. Default is True.
+
+    Returns
+    -------
+    C : ndarray
+        Array of shape (n_steps + 1, len(observables), len(densities)).
+    """
+    V = project_densities(densities, domains, N)
+    W = observable_weights(observables, domains, N)
+    C = np.array([W @ V_n for V_n in evolve_densities(super_adjacency, V, n_steps)])
+
+    if centered:
+        _, vectors = eigs(super_adjacency, k=1, which="LM")
+        h = vectors[:, 0].real
+        ones = observable_weights([np.ones_like], domains, N)
+        h = h / (ones @ h)
+        C = C - np.outer(W @ h, ones @ V)[None]
+
+    return C
@@ -0,0 +1,132 @@
+import numpy as np
+
+from .adjacency_to_super import generate_block, tower_edges
+from .approx_transfer_op import tower_transfer_operators
+from .hofbauer_tower import create_hofbauer_tower
+
+
+def prolong_eigenvectors(eigenvectors, domains, N, refined_domains, refined_N):
+    """
+    Prolong tower eigenvectors to a higher degree and a deeper tower.
+
+    Chebyshev coefficients are padded with zeros up to the refined degree, and the
+    blocks of domains not in the original tower are zero.
+
+    Parameters
+    ----------
+    eigenvectors : ndarray
+        The eigenvectors as columns, N coefficients per domain.
+    domains : list
+        The domains of the original tower.
+    N : integer
+        The order of the Chebyshev polynomials of the original approximation.
+    refined_domains : list
+        The domains of the refined tower, containing every original domain.
+    refined_N : integer
+        The order of the Chebyshev polynomials of the refined approximation.
+
+    Returns
+    -------
+    prolonged : ndarray
+        The prolonged eigenvectors as columns, refined_N coefficients per domain.
+    """
+    index = {domain: i for i, domain in enumerate(refined_domains)}
+    missing = [domain for domain in domains if domain not in index]
+    if missing:
+        raise ValueError(f"Domains {missing} are not in the refined tower.")
+
+    blocks = eigenvectors.reshape(len(domains), N, -1)
+    prolonged = np.zeros(
+        (len(refined_domains), refined_N, blocks.shape[-1]), dtype=eigenvectors.dtype
+    )
+    n_copy = min(N, refined_N)
+    for domain, block in zip(domains, blocks):
+        prolonged[index[domain], :n_copy] = block[:n_copy]
+
+    return prolonged.reshape(len(refined_domains) * refined_N, -1)
+
+
+def resonance_residuals(
+    function_domains,
+    functions,
+    eigenvalues,
+    eigenvectors,
+    domains,
+    N,
+    depth,
+    refined_N=None,
+    refined_depth=None,
+    inverses=None,
+    derivatives=None,
+):
+    """
+    Estimate the error of computed resonances by one refined matrix-vector product.
+
+    Each eigenvector is prolonged to a higher Chebyshev degree and a deeper tower
+    (see `prolong_eigenvectors`), and the refined super adjacency matrix is applied
+    to it once without being stored: only the blocks from domains in the support of
+    the prolonged vectors are generated. The relative residual
+    ||A v - lambda v|| / ||v|| measures how far each eigenpair is from an eigenpair of
+    the refined operator, which costs one product instead of a refined
+    eigendecomposition.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    eigenvalues : ndarray
+        The computed eigenvalues.
+    eigenvectors : ndarray
+        The computed eigenvectors as columns, N coefficients per domain.
+    domains : list
+        The domains of the tower the eigenpairs were computed on.
+    N : integer
+        The order of the Chebyshev polynomials the eigenpairs were computed with.
+    depth : int
+        The depth of the tower the eigenpairs were computed on.
+    refined_N : integer, optional
+        The order of the refined approximation. Default is 2 N.
+    refined_depth : int, optional
+        The depth of the refined tower. Default is 2 depth.
+    inverses : list, optional
+        The list of inverse functions for each segment. Default is synthesised.
+    derivatives : list, optional
+        The list of derivative functions for each segment. Default is synthesised.
+
+    Returns
+    -------
+    residuals : ndarray
+        The relative residual of each eigenpair.
+    """
+    if refined_N is None:
+        refined_N = 2 * N
+    if refined_depth is None:
+        refined_depth = 2 * depth
+    tower = create_hofbauer_tower(function_domains, functions, depth=refined_depth)
+    refined_domains = tower.domains
+    transfer_operators = tower_transfer_operators(
+        function_domains, functions, inverses, derivatives
+    )
+
+    V = prolong_eigenvectors(eigenvectors, domains, N, refined_domains, refined_N)
+    blocks = V.reshape(len(refined_domains), refined_N, -1)
+    support = np.any(blocks != 0, axis=(1, 2))
+
+    AV = np.zeros_like(blocks)
+    for i, j in zip(*tower_edges(tower)):
+        if support[j]:
+            block = generate_block(
+                i,
+                j,
+                refined_domains,
+                tower,
+                transfer_operators,
+                refined_N,
+                refined_N,
+            )
+            AV[i] += block @ blocks[j]
+
+    residual = AV.reshape(V.shape) - V * np.asarray(eigenvalues)[None, :]
+    return np.linalg.norm(residual, axis=0) / np.linalg.norm(V, axis=0)
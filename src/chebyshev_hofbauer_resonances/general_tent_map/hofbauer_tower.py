@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import numpy as np
 
 
@@ -82,15 +84,46 @@ def create_adjacency_matricies(function_domains, functions, depth=1):
         has shape (n, n) where n is the number of complete domains.
     """
 
+    complete_domains, function_ranges, _, _ = _build_tower(
+        function_domains, functions, depth
+    )
+
+    adj_matrices = [
+        construct_adj_matrix(complete_domains, function_ranges[i])
+        for i in range(len(functions))
+    ]
+
+    return complete_domains, adj_matrices
+
+
+def _build_tower(function_domains, functions, depth):
+    """
+    Run the Hofbauer tower construction of `create_adjacency_matricies`.
+
+    Returns
+    -------
+    complete_domains : list
+        List of all domain tuples discovered during tower construction.
+    function_ranges : dict
+        Maps each branch to the list of its ranges on each complete domain, or None.
+    levels : list
+        The iteration in which each complete domain was reached.
+    parents : list
+        The index of the domain each complete domain was first reached from, or -1
+        for the unit interval.
+    """
     complete_domains = []
-    working_domains = [(0, 1)]
+    seen = set()
+    levels = []
+    parents = []
+    working_domains = [((0, 1), -1)]
     new_domains = []
     function_ranges = {i: [] for i in range(len(functions))}
 
-    for _ in range(depth):
+    for level in range(depth):
         while working_domains:
-            current_domain = working_domains.pop()
-            if current_domain in complete_domains:
+            current_domain, parent = working_domains.pop()
+            if current_domain in seen:
                 continue
             for i, (func_domain, func) in enumerate(zip(function_domains, functions)):
                 intersected_domain = intersect(current_domain, func_domain)
@@ -101,18 +134,250 @@ def create_adjacency_matricies(function_domains, functions, depth=1):
                         min(range_start, range_end),
                         max(range_start, range_end),
                     )
-                    new_domains.append(new_range)
+                    new_domains.append((new_range, len(complete_domains)))
                     function_ranges[i].append(new_range)
                 else:
                     function_ranges[i].append(None)
 
             complete_domains.append(current_domain)
+            seen.add(current_domain)
+            levels.append(level)
+            parents.append(parent)
         working_domains = new_domains
         new_domains = []
 
-    adj_matrices = [
-        construct_adj_matrix(complete_domains, function_ranges[i])
-        for i in range(len(functions))
-    ]
+    return complete_domains, function_ranges, levels, parents
 
-    return complete_domains, adj_matrices
+
+class HofbauerTower:
+    """
+    Compact struct-of-arrays representation of a Hofbauer tower.
+
+    Domains are stored as float64 endpoint arrays with an int32 level and parent
+    pointer each. The edges of every branch are stored as one CSR structure over
+    (branch, source domain) rows: the targets of domain j under branch b are
+    ``edge_indices[edge_indptr[b * n + j] : edge_indptr[b * n + j + 1]]``.
+    Towers pickle cheaply and can be saved and loaded without copying (see `save`).
+
+    Parameters
+    ----------
+    starts : ndarray
+        The start of each domain.
+    ends : ndarray
+        The end of each domain.
+    levels : ndarray
+        The tower level at which each domain was reached.
+    parents : ndarray
+        The index of the domain each domain was first reached from, or -1.
+    edge_indptr : ndarray
+        The CSR row pointer over (branch, source domain) rows.
+    edge_indices : ndarray
+        The target domain of each edge.
+    """
+
+    __slots__ = ("starts", "ends", "levels", "parents", "edge_indptr", "edge_indices")
+
+    def __init__(self, starts, ends, levels, parents, edge_indptr, edge_indices):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.levels = np.asarray(levels, dtype=np.int32)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.edge_indptr = np.asarray(edge_indptr, dtype=np.int64)
+        self.edge_indices = np.asarray(edge_indices, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def n_branches(self):
+        """
+        The number of branches of the map.
+        """
+        return (len(self.edge_indptr) - 1) // max(len(self), 1)
+
+    @property
+    def domains(self):
+        """
+        The domains as a list of (start, end) tuples.
+        """
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    @property
+    def nbytes(self):
+        """
+        The memory used by the tower arrays in bytes.
+        """
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def targets(self, branch, j):
+        """
+        Return the domains that domain j maps onto under a branch.
+        """
+        row = branch * len(self) + j
+        return self.edge_indices[self.edge_indptr[row] : self.edge_indptr[row + 1]]
+
+    def edge_list(self):
+        """
+        Return the branch, source and target domain of every edge.
+
+        Returns
+        -------
+        branches, sources, targets : ndarray
+            The edges, sorted by branch and then source domain.
+        """
+        counts = np.diff(self.edge_indptr)
+        rows = np.repeat(np.arange(len(counts)), counts)
+        return rows // max(len(self), 1), rows % max(len(self), 1), self.edge_indices
+
+    def adjacency_matrices(self):
+        """
+        Return the dense adjacency matrices of `create_adjacency_matricies`.
+        """
+        n = len(self)
+        adj_matrices = []
+        for branch in range(self.n_branches):
+            adj_matrix = np.zeros((n, n), dtype=int)
+            for j in range(n):
+                adj_matrix[self.targets(branch, j), j] = 1
+            adj_matrices.append(adj_matrix)
+        return adj_matrices
+
+    @classmethod
+    def from_adjacency(cls, domains, adj_matrices, levels=None, parents=None):
+        """
+        Construct a tower from domains and dense adjacency matrices.
+
+        Parameters
+        ----------
+        domains : list
+            List of domain tuples.
+        adj_matrices : list
+            List of adjacency matrices, one for each function branch.
+        levels : list, optional
+            The level of each domain. Default is -1 for every domain.
+        parents : list, optional
+            The parent of each domain. Default is -1 for every domain.
+
+        Returns
+        -------
+        tower : HofbauerTower
+            The tower.
+        """
+        n = len(domains)
+        endpoints = np.array(domains, dtype=np.float64).reshape(n, 2)
+        if levels is None:
+            levels = np.full(n, -1)
+        if parents is None:
+            parents = np.full(n, -1)
+
+        counts = []
+        indices = []
+        for adj_matrix in adj_matrices:
+            targets, sources = np.nonzero(np.asarray(adj_matrix))
+            order = np.lexsort((targets, sources))
+            indices.append(targets[order])
+            counts.append(np.bincount(sources, minlength=n))
+        counts = np.concatenate(counts) if counts else np.zeros(0, dtype=int)
+        edge_indptr = np.concatenate([[0], np.cumsum(counts)])
+        edge_indices = np.concatenate(indices) if indices else np.zeros(0, dtype=int)
+
+        return cls(
+            endpoints[:, 0], endpoints[:, 1], levels, parents, edge_indptr, edge_indices
+        )
+
+    def save(self, path):
+        """
+        Save the tower.
+
+        If path ends in ".npz" the arrays are saved to an uncompressed npz archive.
+        Otherwise path is a directory and each array is saved as a .npy file, which
+        `load` can memory map.
+
+        Parameters
+        ----------
+        path : str or Path
+            The file or directory to save to.
+        """
+        arrays = {name: getattr(self, name) for name in self.__slots__}
+        path = Path(path)
+        if path.suffix == ".npz":
+            np.savez(path, **arrays)
+        else:
+            path.mkdir(parents=True, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(path / f"{name}.npy", array)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a tower saved with `save`.
+
+        Parameters
+        ----------
+        path : str or Path
+            The npz file or directory to load from.
+        mmap_mode : str, optional
+            The memory map mode for a directory of .npy files, or None to read them
+            into memory. Ignored for npz archives. Default is "r".
+
+        Returns
+        -------
+        tower : HofbauerTower
+            The tower.
+        """
+        path = Path(path)
+        if path.suffix == ".npz":
+            with np.load(path) as archive:
+                arrays = {name: archive[name] for name in cls.__slots__}
+        else:
+            arrays = {
+                name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                for name in cls.__slots__
+            }
+        tower = cls.__new__(cls)
+        for name, array in arrays.items():
+            setattr(tower, name, array)
+        return tower
+
+
+def create_hofbauer_tower(function_domains, functions, depth=1):
+    """
+    Compute the Hofbauer tower of a piecewise map as a HofbauerTower.
+
+    The construction is that of `create_adjacency_matricies`, additionally recording
+    the level and parent of each domain. The edges are found by looking up each
+    range among the domains, so no dense adjacency matrix is built.
+
+    Parameters
+    ----------
+    function_domains : list
+        List of tuples (start, end) specifying the domain for each function branch.
+    functions : list
+        List of callable functions, one for each domain.
+    depth : int, optional
+        Number of iterations to build the tower. Default is 1.
+
+    Returns
+    -------
+    tower : HofbauerTower
+        The tower.
+    """
+    complete_domains, function_ranges, levels, parents = _build_tower(
+        function_domains, functions, depth
+    )
+    index = {domain: k for k, domain in enumerate(complete_domains)}
+    counts = []
+    edge_indices = []
+    for i in range(len(functions)):
+        for new_range in function_ranges[i]:
+            target = index.get(new_range)
+            counts.append(target is not None)
+            if target is not None:
+                edge_indices.append(target)
+
+    n = len(complete_domains)
+    endpoints = np.array(complete_domains, dtype=np.float64).reshape(n, 2)
+    edge_indptr = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    return HofbauerTower(
+        endpoints[:, 0], endpoints[:, 1], levels, parents, edge_indptr, edge_indices
+    )
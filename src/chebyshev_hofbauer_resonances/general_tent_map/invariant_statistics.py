@@ -0,0 +1,247 @@
+import numpy as np
+from scipy.sparse.linalg import eigs
+
+from .branch_inverses import chebyshev_derivative
+from .density_evolution import evaluate_densities
+from .operator_approx import clenshaw_curtis, linear_map
+
+
+def leading_eigenpair(matrix, method="arnoldi", tol=1e-12, max_iter=10000, v0=None):
+    """
+    Compute the eigenvalue of largest modulus and its eigenvector.
+
+    Parameters
+    ----------
+    matrix : ndarray, sparse matrix or LinearOperator
+        The matrix.
+    method : str, optional
+        Either "arnoldi", which uses `scipy.sparse.linalg.eigs`, or "power", which
+        uses power iteration and only needs products with the matrix. Power
+        iteration converges at the rate of the ratio of the two leading moduli.
+        Default is "arnoldi".
+    tol : float, optional
+        The tolerance on the relative residual. Default is 1e-12.
+    max_iter : int, optional
+        The maximum number of power iterations. Default is 10000.
+    v0 : ndarray, optional
+        The starting vector. Default is a vector of ones.
+
+    Returns
+    -------
+    eigenvalue : complex
+        The leading eigenvalue.
+    eigenvector : ndarray
+        The eigenvector, of unit norm.
+    """
+    if v0 is None:
+        v0 = np.ones(matrix.shape[0])
+    if method == "arnoldi":
+        eigenvalues, vectors = eigs(matrix, k=1, which="LM", v0=v0, tol=tol)
+        return eigenvalues[0], vectors[:, 0]
+    if method != "power":
+        raise ValueError(f"Unknown method {method!r}, expected 'arnoldi' or 'power'.")
+
+    v = v0 / np.linalg.norm(v0)
+    eigenvalue = 0.0
+    for _ in range(max_iter):
+        w = matrix @ v
+        eigenvalue = np.vdot(v, w)
+        residual = np.linalg.norm(w - eigenvalue * v)
+        v = w / np.linalg.norm(w)
+        if residual <= tol * abs(eigenvalue):
+            break
+    return eigenvalue, v
+
+
+def breakpoints(domains, function_domains):
+    """
+    Return the sorted points of [0, 1] where a tower density or a branch may jump.
+    """
+    points = {0.0, 1.0}
+    for domain in list(domains) + list(function_domains):
+        points.update(float(p) for p in domain if 0 <= p <= 1)
+    return np.array(sorted(points))
+
+
+def piecewise_quadrature(points, n):
+    """
+    Return Clenshaw-Curtis nodes and weights on each interval between points.
+
+    Parameters
+    ----------
+    points : ndarray
+        The sorted breakpoints.
+    n : integer
+        The degree of the rule on each interval.
+
+    Returns
+    -------
+    x : ndarray
+        Array of shape (len(points) - 1, n + 1) of nodes, one row per interval.
+    w : ndarray
+        The weights, of the same shape.
+    """
+    t, w = clenshaw_curtis(n)
+    intervals = np.column_stack([points[:-1], points[1:]])
+    x = np.array([linear_map(t, interval) for interval in intervals])
+    scale = (intervals[:, 1] - intervals[:, 0]) / 2
+    return x, scale[:, None] * w[None, :]
+
+
+def log_derivative(x, function_domains, derivatives):
+    """
+    Evaluate log|f'| on each row of points, each row inside a single branch domain.
+
+    Points where log|f'| is infinite, such as a critical point at the end of a
+    branch, give NaN.
+    """
+    values = np.full(x.shape, np.nan)
+    for row, points in enumerate(x):
+        middle = points.mean()
+        for (a, b), derivative in zip(function_domains, derivatives):
+            if a <= middle <= b:
+                with np.errstate(divide="ignore"):
+                    values[row] = np.log(np.abs(derivative(points)))
+                break
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def integrate(values, w):
+    """
+    Sum values against quadrature weights, giving NaN values weight zero.
+    """
+    return float(np.sum(np.where(np.isnan(values), 0, values * w)))
+
+
+def tower_statistics(
+    super_adjacency,
+    domains,
+    N,
+    function_domains,
+    functions,
+    derivatives=None,
+    n=64,
+    method="arnoldi",
+):
+    """
+    Compute the invariant density, Lyapunov exponent and escape rate from one solve.
+
+    The leading eigenvector of the super adjacency matrix is pushed down from the
+    tower to [0, 1] (see `evaluate_densities`) and normalised to unit mass. The
+    Lyapunov exponent is the integral of log|f'| against this density, and the
+    escape rate is -log of the leading eigenvalue, which is zero for a closed
+    system. For an open system the density is the conditionally invariant one.
+    Integrals use a Clenshaw-Curtis rule on each interval between the tower domain
+    and branch endpoints, where the density and log|f'| are smooth.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray, sparse matrix or LinearOperator
+        The super adjacency matrix, with K = N.
+    domains : list
+        The domains of the tower.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    derivatives : list, optional
+        The list of derivative functions for each segment. Default is the Chebyshev
+        derivative.
+    n : integer, optional
+        The degree of the Clenshaw-Curtis rule on each interval. Default is 64.
+    method : str, optional
+        The eigensolver, "arnoldi" or "power" (see `leading_eigenpair`). Default is
+        "arnoldi".
+
+    Returns
+    -------
+    statistics : dict
+        With keys "eigenvalue", "escape_rate", "lyapunov_exponent" and "density", a
+        vectorised function giving the normalised density on [0, 1].
+    """
+    if derivatives is None:
+        derivatives = [
+            chebyshev_derivative(function, domain)
+            for domain, function in zip(function_domains, functions)
+        ]
+
+    eigenvalue, vector = leading_eigenpair(super_adjacency, method=method)
+    vector = vector.reshape(-1, 1)
+
+    x, w = piecewise_quadrature(breakpoints(domains, function_domains), n)
+    h = evaluate_densities(vector, domains, N, x.ravel())[:, 0].reshape(x.shape)
+    mass = np.sum(h * w)
+    h = (h / mass).real
+
+    def density(points):
+        points = np.asarray(points, dtype=float)
+        values = evaluate_densities(vector, domains, N, points.ravel())[:, 0]
+        return (values / mass).real.reshape(points.shape)
+
+    log_f = log_derivative(x, function_domains, derivatives)
+    return {
+        "eigenvalue": eigenvalue,
+        "escape_rate": -np.log(abs(eigenvalue)),
+        "lyapunov_exponent": integrate(log_f * h, w),
+        "density": density,
+    }
+
+
+def ulams_statistics(L, function_domains, functions, derivatives=None, n=8, bins=None):
+    """
+    Compute the invariant density, Lyapunov exponent and escape rate of an Ulam matrix.
+
+    The Ulam matrix maps bin i to bin j in entry (i, j), so the invariant masses are
+    its leading left eigenvector. The density is constant on each bin, and log|f'|
+    is averaged over each bin with a Clenshaw-Curtis rule.
+
+    Parameters
+    ----------
+    L : ndarray or sparse matrix
+        The Ulam's method matrix.
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    derivatives : list, optional
+        The list of derivative functions for each segment. Default is the Chebyshev
+        derivative.
+    n : integer, optional
+        The degree of the Clenshaw-Curtis rule on each bin. Default is 8.
+    bins : ndarray, optional
+        The bin edges of the partition, for example from `approx_ulams_adaptive`.
+        Default is the uniform partition of [0, 1].
+
+    Returns
+    -------
+    statistics : dict
+        With keys "eigenvalue", "escape_rate", "lyapunov_exponent" and "density",
+        the normalised density on each bin.
+    """
+    if derivatives is None:
+        derivatives = [
+            chebyshev_derivative(function, domain)
+            for domain, function in zip(function_domains, functions)
+        ]
+
+    eigenvalue, vector = leading_eigenpair(L.T)
+    masses = np.abs(vector.real) / np.abs(vector.real).sum()
+    if bins is None:
+        bins = np.linspace(0, 1, len(masses) + 1)
+    density = masses / np.diff(bins)
+
+    points = np.union1d(bins, breakpoints([], function_domains))
+    x, w = piecewise_quadrature(points, n)
+    cells = np.searchsorted(bins, x.mean(axis=1), side="right") - 1
+    h = density[np.clip(cells, 0, len(density) - 1)][:, None]
+
+    log_f = log_derivative(x, function_domains, derivatives)
+    return {
+        "eigenvalue": eigenvalue,
+        "escape_rate": -np.log(abs(eigenvalue)),
+        "lyapunov_exponent": integrate(log_f * h, w),
+        "density": density,
+    }
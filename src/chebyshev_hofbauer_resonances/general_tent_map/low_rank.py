@@ -0,0 +1,211 @@
+import numpy as np
+from scipy.sparse import bsr_matrix, csr_matrix
+from scipy.sparse.linalg import LinearOperator
+
+from .adjacency_to_super import generate_block, tower_edges
+
+
+def compress_block(block, tol=1e-12):
+    """
+    Truncate a block to low rank with a singular value decomposition.
+
+    Parameters
+    ----------
+    block : ndarray
+        The K x N block.
+    tol : float, optional
+        The largest singular value that may be discarded. Default is 1e-12.
+
+    Returns
+    -------
+    compressed : tuple or ndarray
+        The (left, right) factors, of shapes (K, r) and (r, N) with the singular
+        values absorbed into left, so that block is approximately left @ right.
+        If the factors and their sparse indices would take more memory than the
+        block, the block itself is returned instead.
+    """
+    K, N = block.shape
+    U, s, Vt = np.linalg.svd(block, full_matrices=False)
+    rank = int(np.sum(s > tol))
+    if 3 * rank * (K + N) >= 2 * K * N:
+        return block
+    return U[:, :rank] * s[:rank], Vt[:rank]
+
+
+class LowRankSuperAdjacency(LinearOperator):
+    """
+    Super adjacency matrix with its blocks stored as truncated low rank products.
+
+    The factors of the compressed blocks are stored in two sparse matrices, so that
+    those blocks are approximately left @ right. `right` maps the N coefficients of
+    each initial domain to the r coefficients of each block and `left` maps those
+    onto the K coefficients of each final domain. Blocks that `compress_block` left
+    uncompressed are kept in the block sparse matrix `dense`.
+    Matrix-vector products cost sum r (K + N) rather than K N per compressed block.
+
+    Parameters
+    ----------
+    rows : ndarray
+        The final domain index of each block.
+    cols : ndarray
+        The initial domain index of each block.
+    factors : list
+        The (left, right) factors or the uncompressed block of each block, from
+        `compress_block`.
+    n : int
+        The number of domains.
+    N : integer
+        The order of the Chebyshev polynomials used.
+    K : integer
+        The order of the Chebyshev nodes used.
+    """
+
+    def __init__(self, rows, cols, factors, n, N, K):
+        compressed = np.array([isinstance(f, tuple) for f in factors], dtype=bool)
+        ranks = np.array(
+            [f[1].shape[0] if isinstance(f, tuple) else min(K, N) for f in factors],
+            dtype=int,
+        )
+
+        dense_blocks = [f for f in factors if not isinstance(f, tuple)]
+        dense_rows, dense_cols = rows[~compressed], cols[~compressed]
+        self.dense = bsr_matrix(
+            (
+                np.array(dense_blocks).reshape(-1, K, N),
+                dense_cols,
+                np.searchsorted(dense_rows, np.arange(n + 1)),
+            ),
+            shape=(n * K, n * N),
+        )
+
+        offsets = np.concatenate([[0], np.cumsum(ranks[compressed])])
+        total_rank = int(offsets[-1])
+
+        left_rows, left_cols, left_data = [], [], []
+        right_rows, right_cols, right_data = [], [], []
+        compressed_factors = [f for f in factors if isinstance(f, tuple)]
+        for i, j, (left, right), offset in zip(
+            rows[compressed], cols[compressed], compressed_factors, offsets
+        ):
+            r = right.shape[0]
+            row_index, rank_index = np.meshgrid(
+                i * K + np.arange(K), offset + np.arange(r), indexing="ij"
+            )
+            left_rows.append(row_index.ravel())
+            left_cols.append(rank_index.ravel())
+            left_data.append(left.ravel())
+
+            rank_index, col_index = np.meshgrid(
+                offset + np.arange(r), j * N + np.arange(N), indexing="ij"
+            )
+            right_rows.append(rank_index.ravel())
+            right_cols.append(col_index.ravel())
+            right_data.append(right.ravel())
+
+        def stack(parts):
+            return np.concatenate(parts) if parts else np.zeros(0)
+
+        self.left = csr_matrix(
+            (stack(left_data), (stack(left_rows), stack(left_cols))),
+            shape=(n * K, total_rank),
+        )
+        self.right = csr_matrix(
+            (stack(right_data), (stack(right_rows), stack(right_cols))),
+            shape=(total_rank, n * N),
+        )
+        self.ranks = ranks
+        self.compressed = compressed
+        super().__init__(dtype=float, shape=(n * K, n * N))
+
+    def _matvec(self, x):
+        return self.dense @ x + self.left @ (self.right @ x)
+
+    def _matmat(self, X):
+        return self.dense @ X + self.left @ (self.right @ X)
+
+    def _rmatvec(self, x):
+        return self.dense.T @ x + self.right.T @ (self.left.T @ x)
+
+    @property
+    def nbytes(self):
+        """
+        The memory used by the stored blocks and factors in bytes.
+        """
+        return sum(
+            matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+            for matrix in (self.dense, self.left, self.right)
+        )
+
+    def toarray(self):
+        """
+        Return the (approximate) super adjacency matrix as a dense array.
+        """
+        return self.dense.toarray() + (self.left @ self.right).toarray()
+
+
+def compress_super_adjacency(super_adjacency, tol=1e-12):
+    """
+    Compress a block sparse super adjacency matrix to low rank blocks.
+
+    Parameters
+    ----------
+    super_adjacency : bsr_matrix
+        The super adjacency matrix, with blocks of shape (K, N).
+    tol : float, optional
+        The largest singular value that may be discarded in each block.
+        Default is 1e-12.
+
+    Returns
+    -------
+    compressed : LowRankSuperAdjacency
+        The compressed super adjacency matrix.
+    """
+    super_adjacency = bsr_matrix(super_adjacency)
+    K, N = super_adjacency.blocksize
+    n = super_adjacency.shape[0] // K
+    indptr = super_adjacency.indptr
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    cols = super_adjacency.indices
+    factors = [compress_block(block, tol) for block in super_adjacency.data]
+
+    return LowRankSuperAdjacency(rows, cols, factors, n, N, K)
+
+
+def create_low_rank_super_adjacency(
+    domains, adj_matrices, transfer_operators, N, K, tol=1e-12
+):
+    """
+    Create the super adjacency matrix with each block compressed as it is built.
+
+    Only one uncompressed block is held in memory at a time.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    tol : float, optional
+        The largest singular value that may be discarded in each block.
+        Default is 1e-12.
+
+    Returns
+    -------
+    compressed : LowRankSuperAdjacency
+        The compressed super adjacency matrix.
+    """
+    rows, cols = tower_edges(adj_matrices)
+    factors = [
+        compress_block(
+            generate_block(i, j, domains, adj_matrices, transfer_operators, N, K), tol
+        )
+        for i, j in zip(rows, cols)
+    ]
+
+    return LowRankSuperAdjacency(rows, cols, factors, len(domains), N, K)
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def tent_family(alpha):
+    """
+    Return the branches of the tent map x -> alpha min(x, 1 - x).
+
+    Parameters
+    ----------
+    alpha : float or ndarray
+        The slope, in (1, 2]. An array of shape (P, 1) gives a batch of maps.
+
+    Returns
+    -------
+    function_domains : list
+        The domains of the two branches.
+    functions : list
+        The two branches.
+    """
+    return [(0, 0.5), (0.5, 1)], [
+        lambda x: alpha * np.asarray(x),
+        lambda x: alpha * (1 - np.asarray(x)),
+    ]
+
+
+def logistic_family(alpha):
+    """
+    Return the branches of the logistic map x -> alpha x (1 - x).
+
+    Parameters
+    ----------
+    alpha : float or ndarray
+        The parameter, in (2, 4]. An array of shape (P, 1) gives a batch of maps.
+
+    Returns
+    -------
+    function_domains : list
+        The domains of the two branches.
+    functions : list
+        The two branches, split at the critical point 1/2.
+    """
+
+    def branch(x):
+        x = np.asarray(x)
+        return alpha * x * (1 - x)
+
+    return [(0, 0.5), (0.5, 1)], [branch, branch]
+
+
+MAP_FAMILIES = {"tent": tent_family, "logistic": logistic_family}
@@ -0,0 +1,51 @@
+import numpy as np
+from scipy.sparse.linalg import LinearOperator
+
+from .adjacency_to_super import generate_block, tower_edges
+
+
+class MatrixFreeSuperAdjacency(LinearOperator):
+    """
+    Super adjacency matrix that regenerates its blocks on every product.
+
+    Only the tower and the transfer operators are stored. The transfer operators
+    keep their pullback tables, so after the first product no branch is inverted
+    again and each block costs one basis evaluation and one DCT per product.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    """
+
+    def __init__(self, domains, adj_matrices, transfer_operators, N, K):
+        self.domains = domains
+        self.adj_matrices = adj_matrices
+        self.transfer_operators = transfer_operators
+        self.N = N
+        self.K = K
+        self.rows, self.cols = tower_edges(adj_matrices)
+        n = len(domains)
+        super().__init__(dtype=float, shape=(n * K, n * N))
+
+    def _matmat(self, X):
+        K, N = self.K, self.N
+        X = X.reshape(-1, N, X.shape[-1])
+        Y = np.zeros((self.shape[0] // K, K, X.shape[-1]), dtype=np.result_type(X, 1.0))
+        for i, j in zip(self.rows, self.cols):
+            block = generate_block(
+                i, j, self.domains, self.adj_matrices, self.transfer_operators, N, K
+            )
+            Y[i] += block @ X[j]
+        return Y.reshape(self.shape[0], -1)
+
+    def _matvec(self, x):
+        return self._matmat(x.reshape(-1, 1)).ravel()
@@ -0,0 +1,256 @@
+import numpy as np
+
+from .adjacency_to_super import generate_block, tower_edges
+from .hofbauer_tower import HofbauerTower, create_hofbauer_tower
+from .low_rank import compress_block
+
+REPRESENTATIONS = ("dense", "sparse", "low_rank", "matrix_free")
+
+
+def estimate_rank_fraction(
+    domains, adj_matrices, transfer_operators, N, K, tol=1e-12, samples=8
+):
+    """
+    Estimate the storage of low rank blocks relative to dense blocks.
+
+    A few blocks, spread evenly along the tower edge list, are built and compressed.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    tol : float, optional
+        The low rank truncation tolerance. Default is 1e-12.
+    samples : int, optional
+        The number of blocks to sample. Default is 8.
+
+    Returns
+    -------
+    fraction : float
+        The mean number of stored values of a compressed block divided by K N.
+    """
+    rows, cols = tower_edges(adj_matrices)
+    picks = np.unique(np.linspace(0, len(rows) - 1, samples).astype(int))
+
+    sizes = []
+    for pick in picks:
+        block = generate_block(
+            rows[pick], cols[pick], domains, adj_matrices, transfer_operators, N, K
+        )
+        compressed = compress_block(block, tol)
+        if isinstance(compressed, tuple):
+            sizes.append(1.5 * (compressed[0].size + compressed[1].size))
+        else:
+            sizes.append(compressed.size)
+
+    return float(np.mean(sizes)) / (K * N)
+
+
+def estimate_costs(
+    n_domains, n_edges, n_tables, N, K, k=6, rank_fraction=None, processes=1
+):
+    """
+    Estimate the memory and eigensolve cost of each super adjacency representation.
+
+    Memory is counted in bytes and includes the eigensolver workspace: a LAPACK copy
+    of the matrix for dense eigenvalues, and the Arnoldi basis for the iterative
+    representations. The block sparse data array is held once, since parallel
+    assembly writes it in place (see `create_super_adjacency_parallel`), and the
+    pullback tables once per assembling process. Cost is a rough count of floating
+    point operations for the full dense spectrum or for k eigenvalues by Arnoldi
+    iteration.
+
+    Parameters
+    ----------
+    n_domains : int
+        The number of tower domains.
+    n_edges : int
+        The number of nonzero blocks.
+    n_tables : int
+        The number of (branch, target domain) pullback tables.
+    K : integer
+        The order of the Chebyshev nodes.
+    N : integer
+        The order of the Chebyshev polynomials.
+    k : int, optional
+        The number of eigenvalues wanted from the iterative solvers. Default is 6.
+    rank_fraction : float, optional
+        The estimated storage of a low rank block relative to a dense block, see
+        `estimate_rank_fraction`. If None, the low rank representation is not
+        estimated. Default is None.
+    processes : int, optional
+        The number of processes assembling the block sparse matrix, each of which
+        holds its own pullback tables. Default is 1.
+
+    Returns
+    -------
+    estimates : dict
+        Maps each representation to a dict with keys "memory" and "cost".
+    """
+    size = n_domains * N
+    ncv = max(2 * k + 1, 20)
+    matvecs = 10 * ncv
+    krylov = 8 * size * ncv
+    tables = 16 * K * n_tables
+    orthogonalisation = 4 * matvecs * ncv * size
+
+    estimates = {
+        "dense": {
+            "memory": 2 * 8 * size**2 + 16 * size,
+            "cost": 10 * size**3,
+        },
+        "sparse": {
+            "memory": 8 * n_edges * K * N + 4 * n_edges + krylov + processes * tables,
+            "cost": matvecs * 2 * n_edges * K * N + orthogonalisation,
+        },
+        "matrix_free": {
+            "memory": tables + krylov + 8 * K * N,
+            "cost": matvecs * n_edges * K * N * (4 + np.log2(max(K, 2)))
+            + orthogonalisation,
+        },
+    }
+    if rank_fraction is not None:
+        stored = rank_fraction * n_edges * K * N
+        estimates["low_rank"] = {
+            "memory": 12 * stored + krylov + tables,
+            "cost": matvecs * 2 * stored + orthogonalisation,
+        }
+
+    return estimates
+
+
+def choose_representation(estimates, memory_budget):
+    """
+    Choose the cheapest representation whose memory estimate fits the budget.
+
+    Parameters
+    ----------
+    estimates : dict
+        The estimates from `estimate_costs`.
+    memory_budget : float
+        The memory budget in bytes.
+
+    Returns
+    -------
+    representation : str
+        The chosen representation.
+
+    Raises
+    ------
+    MemoryError
+        If no representation fits the budget.
+    """
+    fits = [
+        name
+        for name in REPRESENTATIONS
+        if name in estimates and estimates[name]["memory"] <= memory_budget
+    ]
+    if not fits:
+        smallest = min(estimates, key=lambda name: estimates[name]["memory"])
+        raise MemoryError(
+            f"No representation fits the memory budget of {memory_budget:.3g} bytes; "
+            f"the smallest is {smallest} at {estimates[smallest]['memory']:.3g} bytes."
+        )
+
+    return min(fits, key=lambda name: estimates[name]["cost"])
+
+
+def plan_super_adjacency(
+    function_domains,
+    functions,
+    N,
+    K,
+    depth,
+    memory_budget,
+    k=6,
+    rank_fraction=None,
+    processes=1,
+):
+    """
+    Plan the representation of a super adjacency matrix before building it.
+
+    Only the Hofbauer tower is constructed. Its domains and edges are counted and
+    used to estimate the memory and eigensolve cost of each representation, and the
+    cheapest one that fits the memory budget is chosen.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    depth : int
+        The depth of the approximation.
+    memory_budget : float
+        The memory budget in bytes.
+    k : int, optional
+        The number of eigenvalues wanted from the iterative solvers. Default is 6.
+    rank_fraction : float, optional
+        The estimated storage of a low rank block relative to a dense block. If None,
+        the low rank representation is not considered. Default is None.
+    processes : int, optional
+        The number of processes that would assemble the block sparse matrix.
+        Default is 1.
+
+    Returns
+    -------
+    plan : dict
+        With keys "representation", the chosen representation, "estimates", from
+        `estimate_costs`, and the tower sizes "n_domains" and "n_edges".
+
+    Raises
+    ------
+    MemoryError
+        If no representation fits the budget.
+    """
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    return plan_tower(
+        tower.domains, tower, N, K, memory_budget, k, rank_fraction, processes
+    )
+
+
+def plan_tower(
+    domains, adj_matrices, N, K, memory_budget, k=6, rank_fraction=None, processes=1
+):
+    """
+    Plan the representation of a super adjacency matrix for a constructed tower.
+
+    See `plan_super_adjacency`.
+    """
+    rows, _ = tower_edges(adj_matrices)
+    if isinstance(adj_matrices, HofbauerTower):
+        branches, _, targets = adj_matrices.edge_list()
+        n_tables = len(np.unique(np.column_stack([branches, targets]), axis=0))
+    else:
+        n_tables = sum(
+            len(np.unique(np.nonzero(adj_matrix)[0])) for adj_matrix in adj_matrices
+        )
+    estimates = estimate_costs(
+        len(domains),
+        len(rows),
+        n_tables,
+        N,
+        K,
+        k=k,
+        rank_fraction=rank_fraction,
+        processes=processes,
+    )
+
+    return {
+        "representation": choose_representation(estimates, memory_budget),
+        "estimates": estimates,
+        "n_domains": len(domains),
+        "n_edges": len(rows),
+    }
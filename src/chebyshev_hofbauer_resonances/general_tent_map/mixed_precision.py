@@ -0,0 +1,261 @@
+import numpy as np
+from scipy.sparse import bsr_matrix
+from scipy.sparse.linalg import LinearOperator, eigs, gmres
+
+from .adjacency_to_super import generate_block, tower_edges
+from .approx_transfer_op import tower_transfer_operators
+from .hofbauer_tower import create_hofbauer_tower
+from .matrix_free import MatrixFreeSuperAdjacency
+
+
+class SinglePrecisionSuperAdjacency(LinearOperator):
+    """
+    Super adjacency matrix whose block values are stored in float32.
+
+    Products are computed in single precision and returned in double precision, so
+    the matrix can be handed to double precision Krylov solvers while taking half
+    the memory of a float64 block sparse matrix. Eigenpairs computed from it are
+    accurate to about single precision; see `refine_eigenpairs`.
+
+    Parameters
+    ----------
+    matrix : bsr_matrix
+        The block sparse matrix with float32 data.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        super().__init__(dtype=float, shape=matrix.shape)
+
+    @property
+    def nbytes(self):
+        """
+        The number of bytes of the block values and their indices.
+        """
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes
+
+    def _matmat(self, X):
+        # Complex vectors are split so the float32 blocks are never upcast.
+        if np.iscomplexobj(X):
+            return self._matmat(X.real) + 1j * self._matmat(X.imag)
+        return (self.matrix @ X.astype(np.float32)).astype(np.float64)
+
+    def _matvec(self, x):
+        return self._matmat(x.reshape(-1, 1)).ravel()
+
+    def bordered(self, eigenvalue, eigenvector, s):
+        """
+        Return A - lambda I with column s replaced by -v, as a LinearOperator.
+
+        This is the Jacobian of the eigenpair equations A v = lambda v with the
+        normalisation v_s = 1, which is well conditioned for a simple eigenvalue.
+        Its products use the single precision blocks, so no further copy of the
+        matrix is made.
+        """
+        column = eigenvector.astype(np.complex64)
+
+        def matvec(z):
+            z = np.asarray(z).ravel()
+            z_s = z[s]
+            z = z.copy()
+            z[s] = 0
+            return self @ z - eigenvalue * z - z_s * column
+
+        return LinearOperator(self.shape, matvec=matvec, dtype=complex)
+
+
+def create_single_precision_super_adjacency(
+    domains, adj_matrices, transfer_operators, N, K
+):
+    """
+    Create the super adjacency matrix with float32 block values.
+
+    Each block is generated in double precision and rounded as it is written, so
+    the full float64 matrix is never held in memory.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+
+    Returns
+    -------
+    super_adjacency : SinglePrecisionSuperAdjacency
+        The super adjacency matrix.
+    """
+    rows, cols = tower_edges(adj_matrices)
+    data = np.empty((len(rows), K, N), dtype=np.float32)
+    for slot, (i, j) in enumerate(zip(rows, cols)):
+        data[slot] = generate_block(
+            i, j, domains, adj_matrices, transfer_operators, N, K
+        )
+    indptr = np.searchsorted(rows, np.arange(len(domains) + 1))
+    matrix = bsr_matrix(
+        (data, cols, indptr), shape=(len(domains) * K, len(domains) * N)
+    )
+    return SinglePrecisionSuperAdjacency(matrix)
+
+
+def refine_eigenpairs(
+    super_adjacency,
+    reference,
+    eigenvalues,
+    eigenvectors,
+    steps=3,
+    tol=1e-14,
+    gmres_tol=1e-6,
+    restart=10,
+):
+    """
+    Refine eigenpairs of a single precision matrix to double precision.
+
+    Each pair is improved by simplified Newton iteration on A v = lambda v with the
+    normalisation v_s = 1, where s is the largest entry of v. The residual
+    r = A v - lambda v is computed with the double precision operator `reference`,
+    typically a MatrixFreeSuperAdjacency recomputing its blocks on demand, and the
+    correction to (v, lambda) solves the Newton system, with the Jacobian at the
+    initial pair (Dongarra, Moler and Wilkinson), by GMRES using only single
+    precision products. No factorisation or further copy of the matrix is made, so
+    memory stays at the single precision blocks and a few Krylov vectors. Unlike
+    inverse iteration with the single precision matrix, this converges to the
+    eigenpair of the double precision operator, each step reducing the error by
+    roughly the single precision rounding times the conditioning of the
+    eigenvalue.
+
+    Parameters
+    ----------
+    super_adjacency : SinglePrecisionSuperAdjacency
+        The single precision matrix.
+    reference : LinearOperator
+        The double precision operator.
+    eigenvalues : ndarray
+        The approximate eigenvalues.
+    eigenvectors : ndarray
+        The approximate eigenvectors as columns.
+    steps : int, optional
+        The maximum number of refinement steps per pair. Default is 3.
+    tol : float, optional
+        The relative residual at which a pair is accepted. Default is 1e-14.
+    gmres_tol : float, optional
+        The relative tolerance of each Newton solve, near the single precision
+        rounding. Default is 1e-6.
+    restart : int, optional
+        The number of Krylov vectors kept by GMRES. Default is 10.
+
+    Returns
+    -------
+    eigenvalues : ndarray
+        The refined eigenvalues.
+    eigenvectors : ndarray
+        The refined eigenvectors, of unit norm.
+    residuals : ndarray
+        The relative residuals ||A v - lambda v|| / |lambda| ||v|| of the pairs,
+        measured with the double precision operator.
+    """
+    eigenvalues = np.array(eigenvalues, dtype=complex)
+    eigenvectors = np.array(eigenvectors, dtype=complex)
+    residuals = np.zeros(len(eigenvalues))
+
+    for p, (eigenvalue, v) in enumerate(zip(eigenvalues, eigenvectors.T)):
+        s = int(np.argmax(np.abs(v)))
+        v = v / v[s]
+        jacobian = super_adjacency.bordered(eigenvalue, v, s)
+        for step in range(steps + 1):
+            residual = reference @ v - eigenvalue * v
+            residuals[p] = np.linalg.norm(residual) / (
+                abs(eigenvalue) * np.linalg.norm(v)
+            )
+            if residuals[p] <= tol or step == steps:
+                break
+            correction, _ = gmres(
+                jacobian, -residual, rtol=gmres_tol, restart=restart, maxiter=20
+            )
+            eigenvalue = eigenvalue + correction[s]
+            correction[s] = 0
+            v = v + correction
+        eigenvalues[p] = eigenvalue
+        eigenvectors[:, p] = v / np.linalg.norm(v)
+
+    return eigenvalues, eigenvectors, residuals
+
+
+def mixed_precision_resonances(
+    function_domains,
+    functions,
+    N,
+    K,
+    depth,
+    k=6,
+    steps=3,
+    inverses=None,
+    derivatives=None,
+    **eigs_kwargs,
+):
+    """
+    Compute resonances from single precision storage, refined to double precision.
+
+    The block values are stored in float32 and the Krylov iteration runs on them;
+    the converged eigenpairs are then refined with `refine_eigenpairs`, using
+    double precision blocks recomputed on demand from the cached pullback tables.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    depth : int
+        The depth of the approximation.
+    k : int, optional
+        The number of resonances. Default is 6.
+    steps : int, optional
+        The maximum number of refinement steps. Default is 3.
+    inverses : list, optional
+        The list of inverse functions for each segment. Default is synthesised.
+    derivatives : list, optional
+        The list of derivative functions for each segment. Default is synthesised.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    eigenvalues : ndarray
+        The k refined eigenvalues of largest modulus, largest first.
+    eigenvectors : ndarray
+        The refined eigenvectors as columns.
+    residuals : ndarray
+        The double precision relative residuals of the pairs.
+    """
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    domains = tower.domains
+    transfer_operators = tower_transfer_operators(
+        function_domains, functions, inverses, derivatives
+    )
+
+    super_adjacency = create_single_precision_super_adjacency(
+        domains, tower, transfer_operators, N, K
+    )
+    eigs_kwargs.setdefault("tol", 1e-6)
+    eigenvalues, eigenvectors = eigs(super_adjacency, k=k, which="LM", **eigs_kwargs)
+    order = np.argsort(-np.abs(eigenvalues))
+
+    reference = MatrixFreeSuperAdjacency(domains, tower, transfer_operators, N, K)
+    return refine_eigenpairs(
+        super_adjacency,
+        reference,
+        eigenvalues[order],
+        eigenvectors[:, order],
+        steps=steps,
+    )
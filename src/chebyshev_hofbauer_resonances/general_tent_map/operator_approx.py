@@ -1,6 +1,6 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from numpy.polynomial.chebyshev import chebfit
+from numpy.polynomial.chebyshev import chebfit, chebvander
 from scipy.fftpack import dct
 from scipy.special import chebyt
 
@@ -35,10 +35,7 @@ def cheb_op_ap(L, K, N, initial_domain=(-1, 1), final_domain=(-1, 1), depth=1):
     """
     assert N == K, "currently only works for K = N"
 
-    k = np.arange(0, K)
-    theta = np.pi * (2 * k + 1) / (2 * K)
-    x = np.cos(theta)
-    x = linear_map(x, final_domain)
+    x = linear_map(chebyshev_nodes(K), final_domain)
 
     y = np.array([L(domain_restricted_chebyt(n, initial_domain))(x) for n in range(N)])
 
@@ -55,6 +52,203 @@ def cheb_op_ap(L, K, N, initial_domain=(-1, 1), final_domain=(-1, 1), depth=1):
     return L_hat
 
 
+def cheb_op_ap_pullback(preimages, weights, N, initial_domain=(-1, 1), nodes="first"):
+    """
+    Return the Chebyshev matrix approximation of a transfer operator from its pullback table.
+
+    Equivalent to `cheb_op_ap` with depth 1 applied to a branch transfer operator,
+    but the whole Chebyshev basis is evaluated at the precomputed preimages in one call
+    rather than applying the operator once per basis function.
+
+    Parameters
+    ----------
+    preimages : ndarray
+        The preimages of the K Chebyshev nodes of the final domain.
+    weights : ndarray
+        The weights 1 / |f'| at the preimages.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    initial_domain : tuple, optional
+        The initial domain of the operator. The default is (-1, 1).
+    nodes : str, optional
+        The kind of Chebyshev nodes of the table, "first" for the K nodes of
+        `chebyshev_nodes` or "second" for the K + 1 nodes of `chebyshev_extrema`.
+        Default is "first".
+
+    Returns
+    -------
+    L_hat : ndarray
+        The matrix approximation of the operator, of shape (N, K).
+    """
+    basis = chebvander(inverse_linear_map(preimages, initial_domain), N - 1)
+    y = (weights[:, None] * basis).T
+
+    if nodes == "second":
+        return extrema_coefficients(y.T, y.shape[1] - 1).T
+
+    L_hat = dct(y, type=2, axis=1) / y.shape[1]
+    L_hat[:, 0] = L_hat[:, 0] / 2
+
+    return L_hat
+
+
+def chebyshev_coefficients(values):
+    """
+    Return the Chebyshev coefficients of the interpolant through values at the Chebyshev nodes.
+
+    Parameters
+    ----------
+    values : ndarray
+        The values at the K nodes returned by `chebyshev_nodes`, along the first axis.
+
+    Returns
+    -------
+    coefficients : ndarray
+        The K Chebyshev coefficients along the first axis.
+    """
+    coefficients = dct(values, type=2, axis=0) / values.shape[0]
+    coefficients[0] = coefficients[0] / 2
+    return coefficients
+
+
+def extrema_coefficients(values, K=None):
+    """
+    Return the Chebyshev coefficients of the interpolant through values at the Chebyshev extrema.
+
+    The coefficients are computed with a DCT-I. Truncating them to the first K
+    gives a series of the same length as `chebyshev_coefficients` on K nodes.
+
+    Parameters
+    ----------
+    values : ndarray
+        The values at the n + 1 points returned by `chebyshev_extrema`, along the
+        first axis.
+    K : integer, optional
+        The number of coefficients to return. Default is n + 1, all of them.
+
+    Returns
+    -------
+    coefficients : ndarray
+        The first K Chebyshev coefficients along the first axis.
+    """
+    n = values.shape[0] - 1
+    coefficients = dct(values, type=1, axis=0) / n
+    coefficients[0] = coefficients[0] / 2
+    coefficients[n] = coefficients[n] / 2
+    return coefficients[:K]
+
+
+def reexpand_chebyshev(coefficients, old_domain, new_domain, K=None):
+    """
+    Re-expand a Chebyshev series on one domain as a Chebyshev series on another domain.
+
+    The series is evaluated at the Chebyshev nodes of the new domain, extrapolating
+    if the new domain is not contained in the old one, and interpolated again.
+
+    Parameters
+    ----------
+    coefficients : ndarray
+        The Chebyshev coefficients on the old domain along the first axis.
+    old_domain : tuple
+        The domain of the series.
+    new_domain : tuple
+        The domain to re-expand the series on.
+    K : integer, optional
+        The number of coefficients of the new series. Default is the number of
+        coefficients of the old series.
+
+    Returns
+    -------
+    new_coefficients : ndarray
+        The K Chebyshev coefficients on the new domain along the first axis.
+    """
+    coefficients = np.asarray(coefficients)
+    if K is None:
+        K = coefficients.shape[0]
+
+    x = inverse_linear_map(linear_map(chebyshev_nodes(K), new_domain), old_domain)
+    basis = chebvander(x, coefficients.shape[0] - 1)
+    values = np.tensordot(basis, coefficients, axes=1)
+
+    return chebyshev_coefficients(values)
+
+
+def chebyshev_nodes(K):
+    """
+    Return the K Chebyshev nodes of the first kind on [-1, 1].
+
+    Parameters
+    ----------
+    K : integer
+        The number of nodes.
+
+    Returns
+    -------
+    x : ndarray
+        The nodes cos(pi * (2k + 1) / 2K) for k = 0, ..., K - 1.
+    """
+    k = np.arange(0, K)
+    theta = np.pi * (2 * k + 1) / (2 * K)
+    return np.cos(theta)
+
+
+def chebyshev_extrema(K):
+    """
+    Return the K + 1 Chebyshev nodes of the second kind on [-1, 1].
+
+    The nodes are nested: those for K are the even numbered nodes for 2K, so
+    samples taken at them can be reused when K is doubled.
+
+    Parameters
+    ----------
+    K : integer
+        The number of intervals between the nodes, at least 1.
+
+    Returns
+    -------
+    x : ndarray
+        The nodes cos(pi * k / K) for k = 0, ..., K.
+    """
+    return np.cos(np.pi * np.arange(K + 1) / K)
+
+
+def clenshaw_curtis(n):
+    """
+    Return the nodes and weights of the (n + 1)-point Clenshaw-Curtis rule on [-1, 1].
+
+    The nodes are the Chebyshev extrema cos(pi k / n), and the rule integrates
+    polynomials of degree n exactly.
+
+    Parameters
+    ----------
+    n : integer
+        The degree of the rule, at least 1.
+
+    Returns
+    -------
+    x : ndarray
+        The nodes cos(pi * k / n) for k = 0, ..., n.
+    w : ndarray
+        The weights.
+    """
+    theta = np.pi * np.arange(n + 1) / n
+    x = chebyshev_extrema(n)
+    w = np.zeros(n + 1)
+    v = np.ones(n - 1)
+    interior = theta[1:-1]
+    if n % 2 == 0:
+        w[0] = w[n] = 1 / (n**2 - 1)
+        for k in range(1, n // 2):
+            v -= 2 * np.cos(2 * k * interior) / (4 * k**2 - 1)
+        v -= np.cos(n * interior) / (n**2 - 1)
+    else:
+        w[0] = w[n] = 1 / n**2
+        for k in range(1, (n - 1) // 2 + 1):
+            v -= 2 * np.cos(2 * k * interior) / (4 * k**2 - 1)
+    w[1:-1] = 2 * v / n
+    return x, w
+
+
 def linear_map(values, domain):
     """
     Linearly map values from the domain [-1, 1] to the domain [a, b].
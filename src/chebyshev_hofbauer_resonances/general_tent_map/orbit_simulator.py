@@ -0,0 +1,292 @@
+import multiprocessing
+
+import numpy as np
+
+_worker_state = {}
+
+
+def apply_map(x, function_domains, functions, out=None):
+    """
+    Apply a piecewise map to an array of points.
+
+    Each point is mapped by the first branch whose domain contains it.
+
+    Parameters
+    ----------
+    x : ndarray
+        The points.
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment. Each must accept and return ndarrays.
+    out : ndarray, optional
+        The array to write the images to, which may be x itself. Default is a new
+        array.
+
+    Returns
+    -------
+    out : ndarray
+        The images of the points.
+    """
+    if out is None:
+        out = np.empty_like(x)
+    assigned = np.zeros(x.shape, dtype=bool)
+    images = []
+    for (a, b), function in zip(function_domains, functions):
+        mask = (x >= a) & (x <= b) & ~assigned
+        assigned |= mask
+        images.append((mask, function(x[mask])))
+    for mask, image in images:
+        out[mask] = image
+    return out
+
+
+class OrbitStatistics:
+    """
+    Statistics accumulated over ensembles of orbits, mergeable across chunks.
+
+    Parameters
+    ----------
+    bins : int
+        The number of histogram bins on [0, 1].
+    max_lag : int
+        The largest lag of the autocorrelation.
+    n_steps : int
+        The number of steps of each orbit.
+    """
+
+    def __init__(self, bins, max_lag, n_steps):
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.lagged = np.zeros(max_lag + 1)
+        self.lag_counts = np.zeros(max_lag + 1, dtype=np.int64)
+        self.total = 0.0
+        self.n_values = 0
+        self.ensemble = np.zeros(n_steps + 1)
+        self.n_orbits = 0
+
+    def merge(self, other):
+        """
+        Add the statistics of another ensemble to these, in place.
+        """
+        self.counts += other.counts
+        self.lagged += other.lagged
+        self.lag_counts += other.lag_counts
+        self.total += other.total
+        self.n_values += other.n_values
+        self.ensemble += other.ensemble
+        self.n_orbits += other.n_orbits
+        return self
+
+    @property
+    def density(self):
+        """
+        The histogram of the orbits after burn-in, normalised as a density.
+        """
+        return self.counts * len(self.counts) / max(self.counts.sum(), 1)
+
+    @property
+    def mean(self):
+        """
+        The time and ensemble mean of the observable after burn-in.
+        """
+        return self.total / self.n_values
+
+    @property
+    def autocorrelation(self):
+        """
+        The centred autocorrelation E[g(x_t) g(x_{t + l})] - E[g]^2 for each lag l.
+        """
+        return self.lagged / self.lag_counts - self.mean**2
+
+    @property
+    def ensemble_mean(self):
+        """
+        The ensemble mean of the observable at each step, starting from the initial
+        distribution. Step n estimates the integral of g L^n rho (see
+        `correlation_functions`).
+        """
+        return self.ensemble / self.n_orbits
+
+
+def simulate_chunk(
+    function_domains,
+    functions,
+    n_orbits,
+    n_steps,
+    seed,
+    observable=None,
+    bins=100,
+    max_lag=20,
+    burn_in=100,
+    sampler=None,
+):
+    """
+    Advance one chunk of orbits, accumulating statistics in bounded memory.
+
+    The orbits are held in one array updated in place. The last max_lag + 1 values
+    of the observable are kept in a ring buffer, so memory is O(n_orbits max_lag)
+    however many steps are taken.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment.
+    n_orbits : int
+        The number of orbits.
+    n_steps : int
+        The number of steps.
+    seed : SeedSequence or int
+        The seed of the chunk's random generator.
+    observable : callable, optional
+        Vectorised observable on [0, 1]. Default is the identity.
+    bins : int, optional
+        The number of histogram bins. Default is 100.
+    max_lag : int, optional
+        The largest autocorrelation lag. Default is 20.
+    burn_in : int, optional
+        The number of steps before the histogram and autocorrelation are
+        accumulated. Default is 100.
+    sampler : callable, optional
+        Function (rng, n) returning n initial points. Default is uniform on [0, 1].
+
+    Returns
+    -------
+    statistics : OrbitStatistics
+        The statistics of the chunk.
+    """
+    if observable is None:
+        observable = np.asarray
+    rng = np.random.default_rng(seed)
+    x = rng.random(n_orbits) if sampler is None else sampler(rng, n_orbits)
+
+    statistics = OrbitStatistics(bins, max_lag, n_steps)
+    statistics.n_orbits = n_orbits
+    history = np.empty((max_lag + 1, n_orbits))
+    scaled = np.empty(n_orbits)
+    indices = np.empty(n_orbits, dtype=np.intp)
+
+    for step in range(n_steps + 1):
+        if step:
+            apply_map(x, function_domains, functions, out=x)
+            np.clip(x, 0, 1, out=x)
+        g = observable(x)
+        statistics.ensemble[step] = g.sum()
+
+        t = step - burn_in
+        if t < 0:
+            continue
+        np.multiply(x, bins, out=scaled)
+        np.minimum(scaled, bins - 1, out=scaled)
+        indices[:] = scaled
+        statistics.counts += np.bincount(indices, minlength=bins)
+
+        history[t % (max_lag + 1)] = g
+        statistics.total += g.sum()
+        statistics.n_values += n_orbits
+        for lag in range(min(t, max_lag) + 1):
+            statistics.lagged[lag] += np.dot(g, history[(t - lag) % (max_lag + 1)])
+            statistics.lag_counts[lag] += n_orbits
+
+    return statistics
+
+
+def _init_worker(function_domains, functions, kwargs):
+    """
+    Store the map and the simulation options in a worker once.
+    """
+    _worker_state["map"] = (function_domains, functions)
+    _worker_state["kwargs"] = kwargs
+
+
+def _simulate_worker(task):
+    n_orbits, seed = task
+    function_domains, functions = _worker_state["map"]
+    return simulate_chunk(
+        function_domains, functions, n_orbits, seed=seed, **_worker_state["kwargs"]
+    )
+
+
+def simulate_ensemble(
+    function_domains,
+    functions,
+    n_orbits,
+    n_steps,
+    chunk_size=100000,
+    processes=1,
+    seed=None,
+    **kwargs,
+):
+    """
+    Simulate a large ensemble of orbits in chunks, optionally in parallel.
+
+    Every chunk draws its initial points from its own random generator, spawned
+    from one SeedSequence, so the streams are independent and the result does not
+    depend on the number of processes, up to rounding. The chunk statistics are
+    merged as they arrive.
+
+    The workers inherit the map, so the branches may be lambdas. The pool always
+    uses the "fork" start method, so more than one process is only supported on
+    platforms with fork.
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment.
+    n_orbits : int
+        The total number of orbits.
+    n_steps : int
+        The number of steps of each orbit.
+    chunk_size : int, optional
+        The number of orbits per chunk. Default is 100000.
+    processes : int, optional
+        The number of worker processes. Default is 1, which simulates in the calling
+        process.
+    seed : int or SeedSequence, optional
+        The root seed. Default is None, fresh entropy.
+    **kwargs
+        Further keyword arguments passed to `simulate_chunk`.
+
+    Returns
+    -------
+    statistics : OrbitStatistics
+        The merged statistics.
+
+    Raises
+    ------
+    ValueError
+        If n_orbits is not positive.
+    """
+    if n_orbits < 1:
+        raise ValueError(f"n_orbits must be positive, got {n_orbits}.")
+
+    sizes = [chunk_size] * (n_orbits // chunk_size)
+    if n_orbits % chunk_size:
+        sizes.append(n_orbits % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(sizes, seeds))
+    kwargs["n_steps"] = n_steps
+
+    if processes == 1:
+        _init_worker(function_domains, functions, kwargs)
+        chunks = map(_simulate_worker, tasks)
+        statistics = _merge(chunks)
+        _worker_state.clear()
+        return statistics
+
+    with multiprocessing.get_context("fork").Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(function_domains, functions, kwargs),
+    ) as pool:
+        return _merge(pool.imap_unordered(_simulate_worker, tasks))
+
+
+def _merge(chunks):
+    statistics = None
+    for chunk in chunks:
+        statistics = chunk if statistics is None else statistics.merge(chunk)
+    return statistics
@@ -0,0 +1,239 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
+
+from .adjacency_to_super import generate_block, tower_edges
+
+DTYPES = {"data": np.float64, "indices": np.int32, "indptr": np.int64}
+
+
+class CSRWriter:
+    """
+    Write a CSR matrix to raw binary files row chunk by row chunk.
+
+    The data, indices and indptr arrays are appended to ``data.bin``,
+    ``indices.bin`` and ``indptr.bin`` in a directory as the rows are produced, so
+    the matrix is never held in memory. `close` records the shape in ``meta.json``.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The directory to write to. Created if it does not exist.
+    n_cols : int
+        The number of columns of the matrix.
+    """
+
+    def __init__(self, directory, n_cols):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.n_cols = n_cols
+        self.n_rows = 0
+        self.nnz = 0
+        self.files = {
+            name: open(self.directory / f"{name}.bin", "wb") for name in DTYPES
+        }
+        np.array([0], dtype=DTYPES["indptr"]).tofile(self.files["indptr"])
+
+    def append(self, rows):
+        """
+        Append rows to the matrix.
+
+        Parameters
+        ----------
+        rows : csr_matrix
+            The rows to append, with `n_cols` columns.
+        """
+        rows = csr_matrix(rows)
+        rows.sort_indices()
+        rows.data.astype(DTYPES["data"]).tofile(self.files["data"])
+        rows.indices.astype(DTYPES["indices"]).tofile(self.files["indices"])
+        (self.nnz + rows.indptr[1:]).astype(DTYPES["indptr"]).tofile(
+            self.files["indptr"]
+        )
+        self.n_rows += rows.shape[0]
+        self.nnz += rows.nnz
+
+    def close(self):
+        """
+        Close the files and return the matrix as a MemmapCSR.
+        """
+        for file in self.files.values():
+            file.close()
+        with open(self.directory / "meta.json", "w") as file:
+            json.dump({"shape": [self.n_rows, self.n_cols], "nnz": self.nnz}, file)
+        return MemmapCSR(self.directory)
+
+
+class MemmapCSR(LinearOperator):
+    """
+    CSR matrix stored in memory mapped files, with products streamed over row chunks.
+
+    Only one chunk of rows is read into memory at a time, so the matrix may exceed
+    the available memory while still benefiting from the operating system's page
+    cache across repeated products.
+
+    Parameters
+    ----------
+    directory : str or Path
+        A directory written by CSRWriter.
+    rows_per_chunk : int, optional
+        The number of rows multiplied at a time. Default is 65536.
+    """
+
+    def __init__(self, directory, rows_per_chunk=65536):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json") as file:
+            meta = json.load(file)
+        self.rows_per_chunk = rows_per_chunk
+        self.arrays = {
+            name: (
+                np.memmap(self.directory / f"{name}.bin", dtype=dtype, mode="r")
+                if (self.directory / f"{name}.bin").stat().st_size
+                else np.zeros(0, dtype=dtype)
+            )
+            for name, dtype in DTYPES.items()
+        }
+        super().__init__(dtype=DTYPES["data"], shape=tuple(meta["shape"]))
+
+    @property
+    def nnz(self):
+        """
+        The number of stored entries.
+        """
+        return int(self.arrays["indptr"][-1])
+
+    def chunk(self, start, stop):
+        """
+        Read rows start to stop as an in-memory csr_matrix.
+        """
+        indptr = np.asarray(self.arrays["indptr"][start : stop + 1])
+        data = self.arrays["data"][indptr[0] : indptr[-1]]
+        indices = self.arrays["indices"][indptr[0] : indptr[-1]]
+        return csr_matrix(
+            (data, indices, indptr - indptr[0]), shape=(stop - start, self.shape[1])
+        )
+
+    def _matmat(self, X):
+        Y = np.empty((self.shape[0], X.shape[1]), dtype=np.result_type(X, self.dtype))
+        for start in range(0, self.shape[0], self.rows_per_chunk):
+            stop = min(start + self.rows_per_chunk, self.shape[0])
+            Y[start:stop] = self.chunk(start, stop) @ X
+        return Y
+
+    def _matvec(self, x):
+        return self._matmat(x.reshape(-1, 1)).ravel()
+
+    def _rmatvec(self, x):
+        y = np.zeros(self.shape[1], dtype=np.result_type(x, self.dtype))
+        for start in range(0, self.shape[0], self.rows_per_chunk):
+            stop = min(start + self.rows_per_chunk, self.shape[0])
+            y += self.chunk(start, stop).T @ x[start:stop]
+        return y
+
+
+def ulams_method_out_of_core(N, M, f, directory, bins_per_chunk=4096):
+    """
+    Compute Ulam's method approximation of the transfer operator out of core.
+
+    Gives the same matrix as `ulams_method`, but as a sparse matrix written to
+    memory mapped files. Bins are sampled a chunk at a time, so memory use is
+    bounded by `bins_per_chunk` times M samples however large N is.
+
+    Parameters
+    ----------
+    N : int
+        The number of bins to partition the interval [0, 1].
+    M : int
+        The number of sample points per bin.
+    f : callable
+        The map function to approximate the transfer operator for. Must accept and
+        return ndarrays.
+    directory : str or Path
+        The directory to write the matrix to.
+    bins_per_chunk : int, optional
+        The number of bins sampled at a time. Default is 4096.
+
+    Returns
+    -------
+    L : MemmapCSR
+        The Ulam's method approximation matrix of shape (N, N).
+    """
+    bins = np.linspace(0, 1, N + 1)
+    offsets = np.linspace(0, 1, M)
+    writer = CSRWriter(directory, N)
+
+    for start in range(0, N, bins_per_chunk):
+        stop = min(start + bins_per_chunk, N)
+        widths = bins[start + 1 : stop + 1] - bins[start:stop]
+        x_samples = bins[start:stop, None] + widths[:, None] * offsets[None, :]
+
+        x_next = f(x_samples.ravel())
+
+        bin_indices = np.digitize(x_next, bins) - 1
+        bin_indices = np.clip(bin_indices, 0, N - 1)
+        rows = np.repeat(np.arange(stop - start), M)
+
+        counts = csr_matrix(
+            (np.ones(len(rows)), (rows, bin_indices)), shape=(stop - start, N)
+        )
+        counts.sum_duplicates()
+        writer.append(counts.multiply(1 / M).tocsr())
+
+    return writer.close()
+
+
+def create_super_adjacency_out_of_core(
+    domains, adj_matrices, transfer_operators, N, K, directory
+):
+    """
+    Create the super adjacency matrix as CSR arrays written to memory mapped files.
+
+    Each block row is generated, appended to the files and discarded, so at most one
+    block row of the matrix is held in memory.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    directory : str or Path
+        The directory to write the matrix to.
+
+    Returns
+    -------
+    super_adjacency : MemmapCSR
+        The super adjacency matrix.
+    """
+    n = len(domains)
+    rows, cols = tower_edges(adj_matrices)
+    writer = CSRWriter(directory, n * N)
+
+    for i in range(n):
+        row_cols = cols[rows == i]
+        blocks = [
+            generate_block(i, j, domains, adj_matrices, transfer_operators, N, K)
+            for j in row_cols
+        ]
+        if blocks:
+            data = np.concatenate(blocks, axis=1)
+            indices = (row_cols[:, None] * N + np.arange(N)).ravel()
+            indices = np.broadcast_to(indices, data.shape)
+        else:
+            data = np.zeros((K, 0))
+            indices = np.zeros((K, 0), dtype=int)
+        indptr = np.arange(K + 1) * data.shape[1]
+        writer.append(
+            csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(K, n * N))
+        )
+
+    return writer.close()
@@ -0,0 +1,119 @@
+import mmap
+import multiprocessing
+
+import numpy as np
+from scipy.sparse import bsr_matrix
+
+from .adjacency_to_super import generate_block, tower_edges
+
+_worker_state = {}
+
+
+def _assemble_chunk(chunk):
+    """
+    Compute the blocks of a chunk of edges and write them into the shared block array.
+
+    Parameters
+    ----------
+    chunk : ndarray
+        Array of rows (slot, i, j), where slot is the position of block i, j in the
+        BSR data array.
+
+    Returns
+    -------
+    count : int
+        The number of blocks written.
+    """
+    data = _worker_state["data"]
+    for slot, i, j in chunk:
+        data[slot] = generate_block(
+            i,
+            j,
+            _worker_state["domains"],
+            _worker_state["adj_matrices"],
+            _worker_state["transfer_operators"],
+            _worker_state["N"],
+            _worker_state["K"],
+        )
+    return len(chunk)
+
+
+def create_super_adjacency_parallel(
+    domains, adj_matrices, transfer_operators, N, K, processes=None, chunks=None
+):
+    """
+    Create the super adjacency matrix as a block sparse matrix using a process pool.
+
+    The nonzero blocks are split into contiguous chunks of the tower edge list.
+    The BSR data array is allocated in an anonymous shared mapping before the
+    workers are forked, and the workers write their blocks directly into it, so no
+    block is pickled back to the parent and the returned matrix uses the mapping as
+    its data without a copy. Chunks are contiguous in the final domain, so each
+    worker reuses the pullback tables of the domains it visits.
+
+    The workers inherit the domains, adjacency matrices and transfer operators, so
+    these may be lambdas. The pool always uses the "fork" start method, so more
+    than one process is only supported on platforms with fork.
+
+    Parameters
+    ----------
+    domains : list
+        The list of domains.
+    adj_matrices : list or HofbauerTower
+        The list of adjacency matrices, or the tower.
+    transfer_operators : list
+        The list of transfer operators.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    processes : int, optional
+        The number of worker processes. Default is the number of CPUs. If 1, the
+        blocks are computed in the calling process.
+    chunks : int, optional
+        The number of chunks the edge list is split into. Default is four per process.
+
+    Returns
+    -------
+    super_adjacency : bsr_matrix
+        The super adjacency matrix, with blocks of shape (K, N).
+    """
+    n = len(domains)
+    rows, cols = tower_edges(adj_matrices)
+    shape = (len(rows), K, N)
+    indptr = np.searchsorted(rows, np.arange(n + 1))
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes == 1 or len(rows) == 0:
+        data = np.empty(shape)
+        for slot, (i, j) in enumerate(zip(rows, cols)):
+            data[slot] = generate_block(
+                i, j, domains, adj_matrices, transfer_operators, N, K
+            )
+        return bsr_matrix((data, cols, indptr), shape=(n * K, n * N))
+
+    if chunks is None:
+        chunks = 4 * processes
+    edges = np.column_stack([np.arange(len(rows)), rows, cols])
+    edge_chunks = np.array_split(edges, min(chunks, len(edges)))
+
+    # The mapping is freed when the last array using it, the matrix data, is.
+    buffer = mmap.mmap(-1, int(np.prod(shape)) * 8)
+    data = np.frombuffer(buffer, dtype=float).reshape(shape)
+    _worker_state.update(
+        data=data,
+        domains=domains,
+        adj_matrices=adj_matrices,
+        transfer_operators=transfer_operators,
+        N=N,
+        K=K,
+    )
+    try:
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            pool.map(_assemble_chunk, edge_chunks)
+    finally:
+        _worker_state.clear()
+
+    return bsr_matrix((data, cols, indptr), shape=(n * K, n * N))
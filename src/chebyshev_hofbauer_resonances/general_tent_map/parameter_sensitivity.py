@@ -0,0 +1,258 @@
+import numpy as np
+from numpy.polynomial.chebyshev import chebder, chebvander
+from scipy.fftpack import dct
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import bsr_matrix
+from scipy.sparse.linalg import eigs
+
+from .adjacency_to_super import has_edge, tower_edges
+from .branch_inverses import chebyshev_derivative, invert_branch
+from .hofbauer_tower import create_hofbauer_tower, intersect
+from .operator_approx import chebyshev_nodes, inverse_linear_map, linear_map
+
+
+def parameter_derivative(map_family, alpha, step=1e-6):
+    """
+    Differentiate each branch of a map family with respect to its parameter.
+
+    Uses central differences of the branch values, which needs no operator to be
+    rebuilt.
+
+    Parameters
+    ----------
+    map_family : callable
+        Function taking a parameter alpha and returning (function_domains, functions).
+    alpha : float
+        The parameter.
+    step : float, optional
+        The finite difference step. Default is 1e-6.
+
+    Returns
+    -------
+    derivatives : list
+        Vectorised functions x -> df/dalpha (alpha, x), one for each branch.
+    """
+    _, upper = map_family(alpha + step)
+    _, lower = map_family(alpha - step)
+    return [
+        lambda x, f_up=f_up, f_down=f_down: (f_up(x) - f_down(x)) / (2 * step)
+        for f_up, f_down in zip(upper, lower)
+    ]
+
+
+def tower_endpoint_derivatives(tower, function_domains, functions, f_x, f_alpha):
+    """
+    Differentiate the endpoints of the tower domains with respect to the parameter.
+
+    Each domain is the image of its parent, intersected with a branch domain, under
+    that branch. Its endpoints are differentiated along that construction, in
+    order of the tower so that parents come first.
+
+    Parameters
+    ----------
+    tower : HofbauerTower
+        The tower.
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment.
+    f_x : list
+        The derivatives of each branch with respect to x.
+    f_alpha : list
+        The derivatives of each branch with respect to the parameter.
+
+    Returns
+    -------
+    d_starts : ndarray
+        The derivative of the start of each domain.
+    d_ends : ndarray
+        The derivative of the end of each domain.
+    """
+    domains = tower.domains
+    d_starts = np.zeros(len(domains))
+    d_ends = np.zeros(len(domains))
+
+    for d, (domain, parent) in enumerate(zip(domains, tower.parents)):
+        if parent < 0:
+            continue
+        parent_domain = domains[parent]
+        for b, (function_domain, function) in enumerate(
+            zip(function_domains, functions)
+        ):
+            intersected = intersect(parent_domain, function_domain)
+            if intersected is None:
+                continue
+            values = (function(intersected[0]), function(intersected[1]))
+            if (min(values), max(values)) != domain:
+                continue
+
+            d_inner = (
+                d_starts[parent] if parent_domain[0] >= function_domain[0] else 0.0,
+                d_ends[parent] if parent_domain[1] <= function_domain[1] else 0.0,
+            )
+            d_values = [
+                f_alpha[b](point) + f_x[b](point) * d_point
+                for point, d_point in zip(intersected, d_inner)
+            ]
+            if values[0] <= values[1]:
+                d_starts[d], d_ends[d] = d_values
+            else:
+                d_ends[d], d_starts[d] = d_values
+            break
+
+    return d_starts, d_ends
+
+
+def approx_super_adjacency_derivative(map_family, alpha, N, K, depth, step=1e-6):
+    """
+    Create the super adjacency matrix and its derivative with respect to the parameter.
+
+    Every block is built from samples w(y) T_n(t(y)) at the preimages y of the
+    Chebyshev nodes. These samples are differentiated analytically along the chain
+    parameter -> tower endpoints -> nodes -> preimages -> weights and basis values.
+    The derivative is transformed by the same DCT as the block, so it shares the
+    block sparse structure of the matrix. Only the partial derivative of the
+    branches in the parameter is taken by finite differences (see
+    `parameter_derivative`).
+
+    The result is the derivative of the matrix for a fixed tower: the tower
+    combinatorics are assumed to be locally constant in the parameter. The
+    endpoint derivatives of the domains at level n grow like |f'|^n, so the
+    parameter window over which the combinatorics hold, and this derivative is
+    meaningful, shrinks like |f'|^-n. For the tent map at alpha 1.8, max |dA| is
+    about 3e2, 1e5 and 8e7 at depths 10, 20 and 30. Central differences of the
+    matrix agree with dA to 1e-7 at depth 20 only for steps below about 1e-9, and
+    differ by 7% at depth 30 even at that step.
+
+    Between windows the truncated matrix jumps, so its derivative does not
+    converge with depth to the sensitivity of the true resonances. The
+    sensitivity of eigenvalue 1 stays at -1 / alpha rather than 0 at every depth.
+    For the logistic map at 3.9, the subleading sensitivities grow from about 10
+    at depth 10 to over 1000 at depth 30. Zeroing the endpoint derivatives of the
+    deep domains whose derivative exceeds their width does not help: it leaves
+    the tent map sensitivities unchanged. Use the shallowest depth at which the
+    resonances of interest have converged, and read the sensitivities as those
+    of the operator truncated at that depth.
+
+    Parameters
+    ----------
+    map_family : callable
+        Function taking a parameter alpha and returning (function_domains, functions).
+    alpha : float
+        The parameter.
+    K : integer
+        The order of the Chebyshev nodes, taken to be the order of the DCT.
+    N : integer
+        The order of the Chebyshev polynomials to use.
+    depth : int
+        The depth of the approximation.
+    step : float, optional
+        The finite difference step for the parameter derivative of the branches.
+        Default is 1e-6.
+
+    Returns
+    -------
+    super_adjacency : bsr_matrix
+        The super adjacency matrix.
+    derivative : bsr_matrix
+        Its derivative with respect to the parameter.
+    domains : list
+        The domains of the tower.
+    """
+    function_domains, functions = map_family(alpha)
+    f_alpha = parameter_derivative(map_family, alpha, step)
+    f_x = [chebyshev_derivative(f, fd) for f, fd in zip(functions, function_domains)]
+    f_xx = [chebyshev_derivative(f, fd) for f, fd in zip(f_x, function_domains)]
+    f_x_alpha = [
+        chebyshev_derivative(f, fd) for f, fd in zip(f_alpha, function_domains)
+    ]
+
+    tower = create_hofbauer_tower(function_domains, functions, depth=depth)
+    domains = tower.domains
+    d_starts, d_ends = tower_endpoint_derivatives(
+        tower, function_domains, functions, f_x, f_alpha
+    )
+
+    nodes = chebyshev_nodes(K)
+    differentiation = chebder(np.eye(N), axis=0)
+    rows, cols = tower_edges(tower)
+    data = np.zeros((len(rows), K, N))
+    d_data = np.zeros((len(rows), K, N))
+
+    for slot, (i, j) in enumerate(zip(rows, cols)):
+        (a_i, b_i), (a_j, b_j) = domains[i], domains[j]
+        x = linear_map(nodes, domains[i])
+        dx = d_starts[i] + (nodes + 1) / 2 * (d_ends[i] - d_starts[i])
+
+        for b in range(tower.n_branches):
+            if not has_edge(tower, b, i, j):
+                continue
+            y = invert_branch(functions[b], function_domains[b], x, f_x[b])
+            fx = f_x[b](y)
+            dy = (dx - f_alpha[b](y)) / fx
+            w = 1 / np.abs(fx)
+            dw = -np.sign(fx) * (f_x_alpha[b](y) + f_xx[b](y) * dy) / fx**2
+
+            t = inverse_linear_map(y, domains[j])
+            dt = (
+                2 * (dy - d_starts[j]) / (b_j - a_j)
+                - 2 * (y - a_j) * (d_ends[j] - d_starts[j]) / (b_j - a_j) ** 2
+            )
+
+            basis = chebvander(t, N - 1)
+            d_basis = chebvander(t, max(N - 2, 0)) @ differentiation
+            samples = w[:, None] * basis
+            d_samples = dw[:, None] * basis + (w * dt)[:, None] * d_basis
+
+            for target, values in ((data, samples), (d_data, d_samples)):
+                L_hat = dct(values, type=2, axis=0) / K
+                L_hat[0] = L_hat[0] / 2
+                target[slot] += L_hat
+
+    indptr = np.searchsorted(rows, np.arange(len(domains) + 1))
+    shape = (len(domains) * K, len(domains) * N)
+    return (
+        bsr_matrix((data, cols, indptr), shape=shape),
+        bsr_matrix((d_data, cols, indptr), shape=shape),
+        domains,
+    )
+
+
+def resonance_sensitivities(super_adjacency, derivative, k=6, **eigs_kwargs):
+    """
+    Compute the leading resonances and their first order sensitivities.
+
+    For a simple eigenvalue lambda with right eigenvector v and left eigenvector w,
+    d lambda = (w^T dA v) / (w^T v).
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix A.
+    derivative : ndarray or sparse matrix
+        The derivative dA of the matrix with respect to the parameter.
+    k : int, optional
+        The number of resonances. Default is 6.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    eigenvalues : ndarray
+        The k eigenvalues of largest modulus, largest first.
+    sensitivities : ndarray
+        The derivative of each eigenvalue with respect to the parameter.
+    """
+    eigenvalues, right = eigs(super_adjacency, k=k, which="LM", **eigs_kwargs)
+    left_eigenvalues, left = eigs(super_adjacency.T, k=k, which="LM", **eigs_kwargs)
+
+    _, match = linear_sum_assignment(
+        np.abs(eigenvalues[:, None] - left_eigenvalues[None, :])
+    )
+    left = left[:, match]
+
+    sensitivities = np.einsum("ik,ik->k", left, derivative @ right) / np.einsum(
+        "ik,ik->k", left, right
+    )
+    order = np.argsort(-np.abs(eigenvalues))
+    return eigenvalues[order], sensitivities[order]
@@ -0,0 +1,571 @@
+import argparse
+import asyncio
+import itertools
+import json
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import bsr_matrix, issparse
+from scipy.sparse.linalg import SuperLU
+
+from .adjacency_to_super import generate_block, tower_edges
+from .approx_transfer_op import approx_ulams, construct_transfer_operators
+from .branch_inverses import synthesize_branches
+from .hofbauer_tower import create_hofbauer_tower
+from .map_families import MAP_FAMILIES
+from .resonance_solvers import shift_invert_eigs
+from .transfer_operator import find_reflection_pairs
+from .ulams_method import leading_eigenvalues
+
+
+def nbytes(value):
+    """
+    Return the memory held by a cached value in bytes.
+
+    Arrays, sparse matrices, sparse LU factorisations, towers, and tuples or lists
+    of them are counted; other values count as zero.
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, SuperLU):
+        # The factors are not exposed without copying them; count complex values
+        # and int32 indices.
+        return 20 * value.nnz + value.perm_r.nbytes + value.perm_c.nbytes
+    if issparse(value):
+        return sum(
+            getattr(value, name).nbytes
+            for name in ("data", "indices", "indptr")
+            if hasattr(value, name)
+        )
+    return int(getattr(value, "nbytes", 0))
+
+
+class LRUCache:
+    """
+    Mapping bounded in entries and bytes, evicting the least recently used.
+
+    The size of an entry is measured with `nbytes` when it is stored, and an entry
+    larger than `maxbytes` on its own is returned without being stored. The entries
+    and counters are guarded by a lock, so `stats` may be read from another thread.
+    The lock is not held while a missing entry is created.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of entries. Default is None, no limit.
+    maxbytes : int, optional
+        The maximum total size of the entries in bytes. Default is None, no limit.
+    """
+
+    def __init__(self, maxsize=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, factory):
+        """
+        Return the entry for key, creating it with factory() if it is missing.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+
+        value = factory()
+        size = nbytes(value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return value
+        with self.lock:
+            self.nbytes += size - self.sizes.get(key, 0)
+            self.entries[key] = value
+            self.sizes[key] = size
+            while (self.maxsize is not None and len(self.entries) > self.maxsize) or (
+                self.maxbytes is not None and self.nbytes > self.maxbytes
+            ):
+                evicted, _ = self.entries.popitem(last=False)
+                self.nbytes -= self.sizes.pop(evicted)
+        return value
+
+    def stats(self):
+        """
+        Return the size, bytes, hits and misses of the cache.
+        """
+        with self.lock:
+            return {
+                "size": len(self),
+                "nbytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class LRUDict(OrderedDict):
+    """
+    Dictionary bounded in items and bytes, evicting the least recently used.
+
+    Reading or writing an item marks it as recently used, so it can be passed
+    where a plain dictionary is filled in place, such as the factorisations of
+    `shift_invert_eigs` or the pullback tables of a `PullbackOperator`. Sizes are
+    measured with `nbytes`; the newest item is kept even if it alone is larger
+    than `maxbytes`, as the caller reads it back.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of items. Default is None, no limit.
+    maxbytes : int, optional
+        The maximum total size of the items in bytes. Default is None, no limit.
+    """
+
+    def __init__(self, maxsize=None, maxbytes=None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizes = {}
+        self.nbytes = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        size = nbytes(value)
+        self.nbytes += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > 1 and (
+            (self.maxsize is not None and len(self) > self.maxsize)
+            or (self.maxbytes is not None and self.nbytes > self.maxbytes)
+        ):
+            evicted, _ = self.popitem(last=False)
+            self.nbytes -= self.sizes.pop(evicted)
+
+
+class ResonanceWorker:
+    """
+    Compute spectra while keeping towers, operators and factorisations warm.
+
+    Each cache is keyed by the map, its parameter and the resolution it depends on,
+    so queries differing only in N or depth share towers, branch inverses and the
+    pullback tables stored in the transfer operators, and queries on a deeper tower
+    reuse every block of the shallower one. Super adjacency matrices are assembled
+    from the cached blocks for each query rather than cached a second time.
+
+    The caches are bounded in bytes, so the memory they hold is at most
+    max_block_bytes + max_operator_bytes + max_factorizations *
+    max_factorization_bytes, plus max_table_bytes for each branch of the
+    max_branches cached maps, plus the max_towers towers. With the defaults this
+    is about 2.5 GiB for maps of two branches.
+
+    Parameters
+    ----------
+    map_families : dict, optional
+        Maps names to functions of alpha returning (function_domains, functions).
+        Default is MAP_FAMILIES.
+    max_towers : int, optional
+        The number of towers kept. Default is 64.
+    max_branches : int, optional
+        The number of sets of transfer operators kept. Default is 64.
+    max_table_bytes : int, optional
+        The bytes of pullback tables kept by each transfer operator. Default is
+        4 MiB.
+    max_block_bytes : int, optional
+        The bytes of operator blocks kept. Default is 1 GiB.
+    max_operator_bytes : int, optional
+        The bytes of Ulam's method matrices kept. Default is 256 MiB.
+    max_factorizations : int, optional
+        The number of operators whose shift factorisations are kept. Default is 16.
+    max_shifts : int, optional
+        The number of shift factorisations kept per operator. Default is 8.
+    max_factorization_bytes : int, optional
+        The bytes of shift factorisations kept per operator. Default is 64 MiB.
+    """
+
+    def __init__(
+        self,
+        map_families=None,
+        max_towers=64,
+        max_branches=64,
+        max_table_bytes=2**22,
+        max_block_bytes=2**30,
+        max_operator_bytes=2**28,
+        max_factorizations=16,
+        max_shifts=8,
+        max_factorization_bytes=2**26,
+    ):
+        self.map_families = MAP_FAMILIES if map_families is None else map_families
+        self.towers = LRUCache(max_towers)
+        self.branches = LRUCache(max_branches)
+        self.blocks = LRUCache(maxbytes=max_block_bytes)
+        self.operators = LRUCache(maxbytes=max_operator_bytes)
+        self.factorizations = LRUCache(max_factorizations)
+        self.max_table_bytes = max_table_bytes
+        self.max_shifts = max_shifts
+        self.max_factorization_bytes = max_factorization_bytes
+
+    def tower(self, name, alpha, depth):
+        """
+        Return the domains of a tower and the tower as a HofbauerTower.
+        """
+
+        def build():
+            function_domains, functions = self.map_families[name](alpha)
+            tower = create_hofbauer_tower(function_domains, functions, depth)
+            return tower.domains, tower
+
+        return self.towers.get((name, alpha, depth), build)
+
+    def transfer_operators(self, name, alpha):
+        """
+        Return the transfer operators of a map, which store its pullback tables.
+
+        The tables of each operator are kept in an LRUDict of at most
+        `max_table_bytes` bytes.
+        """
+
+        def build():
+            function_domains, functions = self.map_families[name](alpha)
+            inverses, derivatives = synthesize_branches(function_domains, functions)
+            reflection_pairs = find_reflection_pairs(function_domains, functions)
+            operators = construct_transfer_operators(
+                inverses, derivatives, reflection_pairs
+            )
+            for operator in operators:
+                operator.tables = LRUDict(maxbytes=self.max_table_bytes)
+            return operators
+
+        return self.branches.get((name, alpha), build)
+
+    def super_adjacency(self, name, alpha, N, depth):
+        """
+        Return the super adjacency matrix as a bsr_matrix, built from cached blocks.
+        """
+        domains, tower = self.tower(name, alpha, depth)
+        transfer_operators = self.transfer_operators(name, alpha)
+        rows, cols = tower_edges(tower)
+        data = np.array(
+            [
+                self.blocks.get(
+                    (name, alpha, N, domains[i], domains[j]),
+                    lambda i=i, j=j: generate_block(
+                        i, j, domains, tower, transfer_operators, N, N
+                    ),
+                )
+                for i, j in zip(rows, cols)
+            ]
+        ).reshape(len(rows), N, N)
+        indptr = np.searchsorted(rows, np.arange(len(domains) + 1))
+        shape = (len(domains) * N, len(domains) * N)
+        return bsr_matrix((data, cols, indptr), shape=shape)
+
+    def ulams(self, name, alpha, N, M):
+        """
+        Return the Ulam's method matrix of a map.
+        """
+
+        def build():
+            function_domains, functions = self.map_families[name](alpha)
+            return approx_ulams(function_domains, functions, None, None, N, M)
+
+        return self.operators.get(("ulams", name, alpha, N, M), build)
+
+    def spectrum(
+        self,
+        map,
+        alpha,
+        N,
+        depth=None,
+        M=None,
+        k=6,
+        sigma=None,
+        method="super_adjacency",
+    ):
+        """
+        Compute eigenvalues of the super adjacency or Ulam's method matrix.
+
+        Parameters
+        ----------
+        map : str
+            The name of the map family.
+        alpha : float
+            The parameter.
+        N : int
+            The order of the Chebyshev polynomials, or the number of Ulam bins.
+        depth : int, optional
+            The depth of the tower. Required for "super_adjacency".
+        M : int, optional
+            The number of samples per Ulam bin. Required for "ulams".
+        k : int, optional
+            The number of eigenvalues. Default is 6.
+        sigma : complex or list, optional
+            A complex number or a [real, imag] pair. If given, the eigenvalues of
+            the super adjacency matrix nearest sigma are computed by shift-invert
+            with a cached factorisation. Default is None, which computes those of
+            largest modulus.
+        method : str, optional
+            Either "super_adjacency" or "ulams". Default is "super_adjacency".
+
+        Returns
+        -------
+        eigenvalues : ndarray
+            The eigenvalues.
+        """
+        alpha = float(alpha)
+        if method == "ulams":
+            return leading_eigenvalues(self.ulams(map, alpha, N, M), k)
+        if method != "super_adjacency":
+            raise ValueError(f"Unknown method {method!r}.")
+
+        A = self.super_adjacency(map, alpha, N, depth)
+        if sigma is None:
+            return leading_eigenvalues(A, k)
+
+        if isinstance(sigma, (list, tuple)):
+            sigma = complex(*sigma)
+        factorizations = self.factorizations.get(
+            (map, alpha, N, depth),
+            lambda: LRUDict(self.max_shifts, self.max_factorization_bytes),
+        )
+        return shift_invert_eigs(A, complex(sigma), k, factorizations=factorizations)
+
+    def stats(self):
+        """
+        Return the statistics of every cache.
+        """
+        return {
+            name: getattr(self, name).stats()
+            for name in ("towers", "branches", "blocks", "operators", "factorizations")
+        }
+
+
+def encode_eigenvalues(eigenvalues):
+    """
+    Encode complex eigenvalues as a JSON list of [real, imag] pairs.
+    """
+    return [[float(z.real), float(z.imag)] for z in np.asarray(eigenvalues, complex)]
+
+
+def is_job_id(value):
+    """
+    Return whether a value may identify a job: None, a string or a number.
+    """
+    return value is None or isinstance(value, (str, int, float))
+
+
+class ResonanceServer:
+    """
+    Serve spectrum queries from a ResonanceWorker over newline-delimited JSON.
+
+    Each line sent by a client is a job such as
+
+        {"id": 1, "op": "spectrum", "params": {"map": "tent", "alpha": 1.8,
+         "N": 16, "depth": 6}, "timeout": 10}
+
+    answered by a line {"id": 1, "status": "ok", "result": [[re, im], ...]}, or a
+    status of "error", "timeout" or "cancelled". The operations are "spectrum",
+    "cancel" (with the "id" of the job to cancel in "params"), "stats" and
+    "shutdown". Jobs from one connection run concurrently with reading further
+    lines, so a client may cancel its own jobs; ids are scoped to the connection,
+    so it cannot cancel those of other clients. Jobs without an id, or with a null
+    one, are given a fresh integer id. A line that is not a JSON object, or whose
+    id is not a string or number, is answered with an error.
+
+    Computations run one at a time in a worker thread. The caches are only filled
+    there, and their statistics are read under their locks. A job cancelled or
+    timed out before it starts never runs; one already running finishes in the
+    background and its result is dropped, though what it added to the caches is
+    kept.
+
+    Parameters
+    ----------
+    worker : ResonanceWorker, optional
+        The worker. Default is a new ResonanceWorker.
+    default_timeout : float, optional
+        The timeout in seconds of jobs not giving one. Default is None, no timeout.
+    """
+
+    def __init__(self, worker=None, default_timeout=None):
+        self.worker = ResonanceWorker() if worker is None else worker
+        self.default_timeout = default_timeout
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.jobs = {}
+        self.ids = itertools.count()
+        self.connections = itertools.count()
+        self.stopped = None
+
+    async def run_job(self, message, connection):
+        job_id = message.get("id")
+        op = message.get("op", "spectrum")
+        params = message.get("params", {})
+
+        if op == "stats":
+            return {"id": job_id, "status": "ok", "result": self.worker.stats()}
+        if op == "shutdown":
+            self.stopped.set()
+            return {"id": job_id, "status": "ok", "result": None}
+        if op == "cancel":
+            task = self.jobs.get((connection, params.get("id")))
+            cancelled = task is not None and task.cancel()
+            return {"id": job_id, "status": "ok", "result": cancelled}
+        if op != "spectrum":
+            return {"id": job_id, "status": "error", "error": f"Unknown op {op!r}."}
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.executor, lambda: self.worker.spectrum(**params)
+        )
+        timeout = message.get("timeout", self.default_timeout)
+        try:
+            eigenvalues = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return {"id": job_id, "status": "timeout"}
+        except asyncio.CancelledError:
+            future.cancel()
+            return {"id": job_id, "status": "cancelled"}
+        except Exception as error:
+            return {"id": job_id, "status": "error", "error": repr(error)}
+        return {"id": job_id, "status": "ok", "result": encode_eigenvalues(eigenvalues)}
+
+    async def respond(self, message, writer, connection):
+        job_id = message["id"]
+        try:
+            response = await self.run_job(message, connection)
+        except asyncio.CancelledError:
+            response = {"id": job_id, "status": "cancelled"}
+        finally:
+            self.jobs.pop((connection, job_id), None)
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        connection = next(self.connections)
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                message = None
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("A job must be a JSON object.")
+                    if not isinstance(message.get("params", {}), dict):
+                        raise ValueError("The params of a job must be an object.")
+                    if not is_job_id(message.get("id")):
+                        raise ValueError("The id of a job must be a string or number.")
+                    if message.get("op") == "cancel" and not is_job_id(
+                        message.get("params", {}).get("id")
+                    ):
+                        raise ValueError("The id to cancel must be a string or number.")
+                except ValueError as error:
+                    response = {"status": "error", "error": repr(error)}
+                    if isinstance(message, dict) and "id" in message:
+                        response = {"id": message["id"], **response}
+                    writer.write((json.dumps(response) + "\n").encode())
+                    continue
+                if message.get("id") is None:
+                    message["id"] = next(self.ids)
+                job_id = message["id"]
+                task = asyncio.create_task(self.respond(message, writer, connection))
+                self.jobs[(connection, job_id)] = task
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (asyncio.CancelledError, ConnectionError):
+            for task in tasks:
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def serve(self, path=None, host="127.0.0.1", port=0, ready=None):
+        """
+        Listen on a Unix socket, or a localhost port, until a shutdown job arrives.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path of the Unix socket. Default is None, which listens on host and
+            port instead.
+        host : str, optional
+            The host to listen on. Default is "127.0.0.1".
+        port : int, optional
+            The port to listen on. Default is 0, any free port.
+        ready : callable, optional
+            Called with the listening address once the server accepts connections.
+        """
+        self.stopped = asyncio.Event()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+        if ready is not None:
+            ready(path if path is not None else server.sockets[0].getsockname()[:2])
+        async with server:
+            await self.stopped.wait()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def request(messages, path=None, host="127.0.0.1", port=None):
+    """
+    Send jobs to a running ResonanceServer and wait for all their responses.
+
+    Parameters
+    ----------
+    messages : list
+        The job dictionaries.
+    path : str, optional
+        The path of the server's Unix socket.
+    host : str, optional
+        The host of the server. Default is "127.0.0.1".
+    port : int, optional
+        The port of the server, if it is not listening on a Unix socket.
+
+    Returns
+    -------
+    responses : list
+        The response dictionaries, in the order they were completed.
+    """
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection((host, port))
+
+    with connection, connection.makefile("rw") as stream:
+        for message in messages:
+            stream.write(json.dumps(message) + "\n")
+        stream.flush()
+        return [json.loads(stream.readline()) for _ in messages]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve resonance spectra.")
+    parser.add_argument("--socket", help="the path of a Unix socket to listen on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--timeout", type=float, help="the default job timeout")
+    args = parser.parse_args()
+
+    server = ResonanceServer(default_timeout=args.timeout)
+    asyncio.run(
+        server.serve(
+            args.socket,
+            args.host,
+            args.port,
+            ready=lambda address: print(f"Listening on {address}", flush=True),
+        )
+    )
@@ -0,0 +1,227 @@
+import numpy as np
+from scipy.sparse import csc_matrix, identity
+from scipy.sparse.linalg import LinearOperator, eigs, splu
+
+
+def factorize_shift(super_adjacency, sigma):
+    """
+    Compute the sparse LU factorisation of the shifted super adjacency matrix.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix A.
+    sigma : complex
+        The shift.
+
+    Returns
+    -------
+    lu : SuperLU
+        The factorisation of A - sigma I.
+    """
+    dtype = complex if np.iscomplexobj(sigma) and np.imag(sigma) != 0 else float
+    A = csc_matrix(super_adjacency, dtype=dtype)
+    return splu(A - sigma * identity(A.shape[0], dtype=dtype, format="csc"))
+
+
+def shift_invert_eigs(
+    super_adjacency,
+    sigma,
+    k=6,
+    factorizations=None,
+    reuse_radius=0.0,
+    return_eigenvectors=False,
+    **eigs_kwargs,
+):
+    """
+    Compute the k eigenvalues of the super adjacency matrix nearest to sigma.
+
+    Arnoldi iteration is run on (A - s I)^{-1}, where the factorisation of A - s I is
+    computed once and reused by every restart. Factorisations are stored in
+    `factorizations`, keyed by their shift s. If a stored shift lies within
+    `reuse_radius` of sigma it is reused rather than refactoring; in that case 2k
+    eigenvalues are computed around s and the k nearest to sigma are returned if
+    they are certainly the nearest, that is if the disc about s containing the
+    computed eigenvalues contains the disc about sigma through the k-th of them.
+    Otherwise A - sigma I is factorised after all.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix A.
+    sigma : complex
+        The target point.
+    k : int, optional
+        The number of eigenvalues to compute. Default is 6.
+    factorizations : dict, optional
+        Factorisations from previous calls, updated in place. Default is a new dict.
+    reuse_radius : float, optional
+        The largest distance from sigma at which a stored factorisation is reused.
+        Default is 0.0, which only reuses a factorisation at exactly sigma.
+    return_eigenvectors : bool, optional
+        Whether to return the eigenvectors. Default is False.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    eigenvalues : ndarray
+        The k eigenvalues nearest to sigma, nearest first.
+    eigenvectors : ndarray
+        The corresponding eigenvectors as columns, if `return_eigenvectors` is True.
+    """
+    if factorizations is None:
+        factorizations = {}
+
+    n = super_adjacency.shape[0]
+    shifts = list(factorizations)
+    distances = [abs(shift - sigma) for shift in shifts]
+    covered = False
+    if sigma not in factorizations and shifts and min(distances) <= reuse_radius:
+        shift = shifts[int(np.argmin(distances))]
+        eigenvalues, vectors = _shifted_eigs(
+            factorizations[shift], shift, min(2 * k, n - 2), **eigs_kwargs
+        )
+        order = np.argsort(np.abs(eigenvalues - sigma))[:k]
+        radius = np.abs(eigenvalues - shift).max()
+        covered = radius >= abs(sigma - shift) + abs(eigenvalues[order[-1]] - sigma)
+
+    if not covered:
+        if sigma not in factorizations:
+            factorizations[sigma] = factorize_shift(super_adjacency, sigma)
+        eigenvalues, vectors = _shifted_eigs(
+            factorizations[sigma], sigma, min(k, n - 2), **eigs_kwargs
+        )
+        order = np.argsort(np.abs(eigenvalues - sigma))[:k]
+
+    if return_eigenvectors:
+        return eigenvalues[order], vectors[:, order]
+    return eigenvalues[order]
+
+
+def _shifted_eigs(lu, shift, n_eigs, **eigs_kwargs):
+    """
+    Return the n_eigs eigenvalues nearest to shift, and their vectors, from the
+    factorisation of A - shift I.
+    """
+    n = lu.shape[0]
+    operator = LinearOperator((n, n), matvec=lu.solve, dtype=lu.U.dtype)
+    mu, vectors = eigs(operator, k=n_eigs, which="LM", **eigs_kwargs)
+    return shift + 1 / mu, vectors
+
+
+def targeted_resonances(
+    super_adjacency, centers, k=6, reuse_radius=0.0, factorizations=None, **eigs_kwargs
+):
+    """
+    Compute the resonances nearest to each of a list of target points.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix.
+    centers : list
+        The target points, for example points along a contour.
+    k : int, optional
+        The number of eigenvalues to compute per target. Default is 6.
+    reuse_radius : float, optional
+        The largest distance at which a factorisation is reused for a later target.
+        Default is 0.0.
+    factorizations : dict, optional
+        Factorisations from previous calls, updated in place. Default is a new dict.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    resonances : list
+        For each target, the k eigenvalues nearest to it.
+    """
+    if factorizations is None:
+        factorizations = {}
+
+    return [
+        shift_invert_eigs(
+            super_adjacency,
+            center,
+            k=k,
+            factorizations=factorizations,
+            reuse_radius=reuse_radius,
+            **eigs_kwargs,
+        )
+        for center in centers
+    ]
+
+
+def annulus_resonances(
+    super_adjacency,
+    inner_radius,
+    outer_radius,
+    k=6,
+    reuse_radius=0.0,
+    factorizations=None,
+    **eigs_kwargs,
+):
+    """
+    Compute the resonances in the annulus inner_radius <= |z| <= outer_radius.
+
+    Targets are spaced around the middle circle of the annulus, one annulus width
+    apart, and the eigenvalues found near each are pooled.
+
+    Each target is factorised by default. Reusing the factorisation of the
+    previous target, one spacing away, needs the 2k eigenvalues around it to
+    certainly contain the k nearest to the new target (see `shift_invert_eigs`),
+    which only holds if the spacing is small next to the distance between
+    eigenvalues. For the tent map at N = 24 and depth 60 it never held, for any
+    of the annuli 0.3-0.6, 0.45-0.6 and 0.6-1.05 with k = 6 or 20, and the failed
+    attempts made the scan 2.5 to 3 times slower. A scan of the same matrix and
+    annulus repeated with a different k instead reuses every factorisation exactly
+    when the same `factorizations` dict is passed.
+
+    Parameters
+    ----------
+    super_adjacency : ndarray or sparse matrix
+        The super adjacency matrix.
+    inner_radius : float
+        The inner radius of the annulus.
+    outer_radius : float
+        The outer radius of the annulus.
+    k : int, optional
+        The number of eigenvalues to compute per target. Default is 6.
+    reuse_radius : float, optional
+        The largest distance at which a factorisation is reused for a later target.
+        Default is 0.0, which only reuses factorisations at the same targets.
+    factorizations : dict, optional
+        Factorisations from previous calls, updated in place. Default is a new dict.
+    **eigs_kwargs
+        Further keyword arguments passed to `scipy.sparse.linalg.eigs`.
+
+    Returns
+    -------
+    resonances : ndarray
+        The distinct resonances found in the annulus, sorted by decreasing modulus.
+    """
+    radius = (inner_radius + outer_radius) / 2
+    width = max(outer_radius - inner_radius, 1e-3 * radius)
+    n_centers = max(int(np.ceil(2 * np.pi * radius / width)), 1)
+    centers = radius * np.exp(2j * np.pi * np.arange(n_centers) / n_centers)
+
+    found = np.concatenate(
+        targeted_resonances(
+            super_adjacency,
+            centers,
+            k=k,
+            reuse_radius=reuse_radius,
+            factorizations=factorizations,
+            **eigs_kwargs,
+        )
+    )
+    modulus = np.abs(found)
+    found = found[(modulus >= inner_radius) & (modulus <= outer_radius)]
+
+    resonances = []
+    for z in found[np.argsort(-np.abs(found))]:
+        if all(abs(z - r) > 1e-8 * max(1, abs(z)) for r in resonances):
+            resonances.append(z)
+
+    return np.array(resonances)
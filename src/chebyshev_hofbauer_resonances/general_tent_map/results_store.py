@@ -0,0 +1,315 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+SCALAR_COLUMNS = {
+    "alpha": np.float64,
+    "N": np.int32,
+    "depth": np.int32,
+    "M": np.int32,
+    "map": np.int16,
+    "method": np.int16,
+    "size": np.int64,
+    "time": np.float64,
+}
+ARRAY_COLUMNS = {"eigenvalues": np.complex128, "residuals": np.float64}
+KEY_COLUMNS = ("map", "alpha", "N", "depth", "M", "method")
+
+
+class ResultsStore:
+    """
+    Append-only store of sweep results in column oriented, alpha sorted shards.
+
+    Rows are buffered and written in shards of at most `chunk_size` rows, one
+    compressed ``.npz`` file each with one array per column. Within a shard the
+    rows are sorted by alpha, and ``index.json`` records the alpha range of every
+    shard, so a range query only opens the shards overlapping it and only
+    decompresses the columns asked for. Shards and the index are replaced
+    atomically, so a reader never sees a partial write. Records appended together
+    with `extend` are sorted as one batch, so their shards do not overlap.
+
+    Each row is keyed by (map, alpha, N, depth, M, method); depth is -1 for methods
+    without a tower, and M is -1 for methods without sampling. A row whose key is
+    already stored is skipped, so ingesting the same results twice does not
+    duplicate them. Eigenvalues and residuals are stored as rows of width k,
+    padded with NaN.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The directory of the store. Created if it does not exist.
+    k : int, optional
+        The number of eigenvalues per row. Default is 6. Ignored if the store
+        already exists.
+    chunk_size : int, optional
+        The number of rows per shard. Default is 4096.
+    """
+
+    def __init__(self, directory, k=6, chunk_size=4096):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        index_path = self.directory / "index.json"
+        if index_path.exists():
+            with open(index_path) as file:
+                self.index = json.load(file)
+        else:
+            self.index = {"k": k, "maps": [], "methods": [], "shards": []}
+        self.buffer = []
+        self._keys = None
+
+    @property
+    def k(self):
+        return self.index["k"]
+
+    def __len__(self):
+        return sum(shard["rows"] for shard in self.index["shards"]) + len(self.buffer)
+
+    def method_code(self, method):
+        """
+        Return the integer code of a method name, registering it if new.
+        """
+        if method not in self.index["methods"]:
+            self.index["methods"].append(method)
+        return self.index["methods"].index(method)
+
+    def map_code(self, name):
+        """
+        Return the integer code of a map name, registering it if new.
+        """
+        if name not in self.index["maps"]:
+            self.index["maps"].append(name)
+        return self.index["maps"].index(name)
+
+    @property
+    def keys(self):
+        """
+        The set of keys of the stored and buffered rows, read from the shards once.
+        """
+        if self._keys is None:
+            self._keys = set()
+            for shard in self.index["shards"]:
+                with np.load(self.directory / shard["name"]) as data:
+                    columns = [data[name].tolist() for name in KEY_COLUMNS]
+                self._keys.update(zip(*columns))
+        return self._keys
+
+    def append(self, record):
+        """
+        Append one result, writing the buffer whenever `chunk_size` rows are buffered.
+
+        Parameters
+        ----------
+        record : dict
+            A result with "alpha", "N" and "method", and optionally "map", "depth",
+            "M", "size", "time", "eigenvalues" (complex, or [real, imag] pairs) and
+            "residuals". Missing values are stored as -1, NaN or an empty map name.
+
+        Returns
+        -------
+        appended : bool
+            False if a row with the same key is already stored, in which case the
+            record is skipped.
+        """
+        appended = self._buffer_row(record)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return appended
+
+    def extend(self, records):
+        """
+        Append many results, returning the number appended.
+
+        Every record is buffered before any is written, so the batch is sorted by
+        alpha as a whole, with the rows already buffered, and split into shards
+        covering disjoint alpha ranges whatever order the records arrive in.
+        """
+        n_rows = sum(self._buffer_row(record) for record in records)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return n_rows
+
+    def _buffer_row(self, record):
+        """
+        Add one result to the buffer without writing it, see `append`.
+        """
+        row = {
+            "alpha": float(record["alpha"]),
+            "N": int(record["N"]),
+            "depth": int(record.get("depth", -1)),
+            "M": int(record.get("M", -1)),
+            "map": self.map_code(record.get("map", "")),
+            "method": self.method_code(record["method"]),
+            "size": record.get("size", -1),
+            "time": record.get("time", np.nan),
+        }
+        key = tuple(row[name] for name in KEY_COLUMNS)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        for name, dtype in ARRAY_COLUMNS.items():
+            values = np.asarray(record.get(name, []))
+            if name == "eigenvalues" and values.ndim == 2:
+                values = values[:, 0] + 1j * values[:, 1]
+            values = values.astype(dtype)
+            padded = np.full(self.k, np.nan, dtype=dtype)
+            padded[: min(len(values), self.k)] = values[: self.k]
+            row[name] = padded
+
+        self.buffer.append(row)
+        return True
+
+    def flush(self):
+        """
+        Write the buffered rows, sorted by alpha, as new shards and update the index.
+
+        The rows are split into the fewest shards of at most `chunk_size` rows, of
+        near equal size, so consecutive shards cover consecutive alpha ranges.
+        """
+        if not self.buffer:
+            return
+
+        columns = {
+            name: np.array([row[name] for row in self.buffer], dtype=dtype)
+            for name, dtype in {**SCALAR_COLUMNS, **ARRAY_COLUMNS}.items()
+        }
+        order = np.argsort(columns["alpha"], kind="stable")
+        n_shards = -(-len(order) // self.chunk_size)
+
+        for part in np.array_split(order, n_shards):
+            shard = {name: values[part] for name, values in columns.items()}
+            name = f"shard-{len(self.index['shards']):06d}.npz"
+            fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".npz.tmp")
+            with os.fdopen(fd, "wb") as file:
+                np.savez_compressed(file, **shard)
+            os.replace(temporary, self.directory / name)
+
+            self.index["shards"].append(
+                {
+                    "name": name,
+                    "rows": len(part),
+                    "alpha_min": float(shard["alpha"][0]),
+                    "alpha_max": float(shard["alpha"][-1]),
+                }
+            )
+        self.write_index()
+        self.buffer = []
+
+    def write_index(self):
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.index, file)
+        os.replace(temporary, self.directory / "index.json")
+
+    def query(
+        self,
+        alpha_min=-np.inf,
+        alpha_max=np.inf,
+        N=None,
+        depth=None,
+        method=None,
+        columns=None,
+        map_name=None,
+    ):
+        """
+        Return the stored rows with alpha in [alpha_min, alpha_max].
+
+        Buffered rows are not included until they are flushed.
+
+        Parameters
+        ----------
+        alpha_min, alpha_max : float, optional
+            The alpha range. Default is every alpha.
+        N, depth : int, optional
+            If given, only rows with this N or depth are returned.
+        method : str, optional
+            If given, only rows of this method are returned.
+        map_name : str, optional
+            If given, only rows of this map are returned.
+        columns : list, optional
+            The columns to return. Default is every column.
+
+        Returns
+        -------
+        result : dict
+            Maps each column name to an array of the matching rows, sorted by alpha
+            within each shard. The method column holds method names.
+        """
+        if columns is None:
+            columns = list(SCALAR_COLUMNS) + list(ARRAY_COLUMNS)
+        filters = {"N": N, "depth": depth}
+        for name, value, names in (
+            ("method", method, self.index["methods"]),
+            ("map", map_name, self.index["maps"]),
+        ):
+            if value is not None:
+                filters[name] = names.index(value) if value in names else -1
+        filters = {name: value for name, value in filters.items() if value is not None}
+
+        parts = {name: [] for name in columns}
+        for shard in self.index["shards"]:
+            if shard["alpha_max"] < alpha_min or shard["alpha_min"] > alpha_max:
+                continue
+            with np.load(self.directory / shard["name"]) as data:
+                # Each access to an npz member decompresses it, so read each once.
+                loaded = {}
+
+                def column(name):
+                    if name not in loaded:
+                        loaded[name] = data[name]
+                    return loaded[name]
+
+                alpha = column("alpha")
+                start = np.searchsorted(alpha, alpha_min, side="left")
+                stop = np.searchsorted(alpha, alpha_max, side="right")
+                keep = np.ones(stop - start, dtype=bool)
+                for name, value in filters.items():
+                    keep &= column(name)[start:stop] == value
+                for name in columns:
+                    parts[name].append(column(name)[start:stop][keep])
+
+        result = {}
+        for name in columns:
+            dtype = {**SCALAR_COLUMNS, **ARRAY_COLUMNS}[name]
+            shape = (0, self.k) if name in ARRAY_COLUMNS else (0,)
+            result[name] = (
+                np.concatenate(parts[name]) if parts[name] else np.empty(shape, dtype)
+            )
+        for name, names in (("method", "methods"), ("map", "maps")):
+            if name in result:
+                result[name] = np.array(self.index[names], dtype=object)[result[name]]
+        return result
+
+
+def ingest_sweep(store, output):
+    """
+    Append the checkpointed results of a sweep (see `run_sweep`) to a store.
+
+    Jobs checkpointed as failed, and results already in the store, are skipped.
+    The results are appended as one batch with `ResultsStore.extend`, so the shards
+    written cover disjoint alpha ranges.
+
+    Parameters
+    ----------
+    store : ResultsStore
+        The store.
+    output : str or Path
+        The output directory of the sweep.
+
+    Returns
+    -------
+    n_rows : int
+        The number of results appended.
+    """
+    records = []
+    for path in sorted((Path(output) / "jobs").glob("*.json")):
+        with open(path) as file:
+            record = json.load(file)
+        if record.get("status") != "failed":
+            records.append(record)
+    n_rows = store.extend(records)
+    store.flush()
+    return n_rows
@@ -0,0 +1,316 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from .approx_transfer_op import approx_super_adjacency, approx_ulams
+from .map_families import MAP_FAMILIES
+from .ulams_method import leading_eigenvalues
+
+METHODS = ("approx_super_adjacency", "approx_ulams")
+
+
+def grid(values):
+    """
+    Expand a manifest grid entry to a list of values.
+
+    A scalar gives a single value, a list is taken as is, and a dictionary with
+    "start", "stop" and "num" gives evenly spaced values as np.linspace.
+    """
+    if isinstance(values, dict):
+        return np.linspace(values["start"], values["stop"], values["num"]).tolist()
+    if isinstance(values, list):
+        return values
+    return [values]
+
+
+def expand_manifest(manifest):
+    """
+    Expand a sweep manifest to the list of its jobs.
+
+    The manifest is a dictionary with the name of a map family "map", a "method",
+    one of METHODS, and grids (see `grid`) for "alpha" and "N", and for "depth"
+    with approx_super_adjacency or "M" with approx_ulams. The number of eigenvalues
+    "k" defaults to 6. Every combination of the grids is a job.
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest.
+
+    Returns
+    -------
+    jobs : list
+        The job dictionaries, each with a unique "key".
+    """
+    method = manifest["method"]
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}.")
+    if manifest["map"] not in MAP_FAMILIES:
+        raise ValueError(f"Unknown map {manifest['map']!r}.")
+
+    resolution = "depth" if method == "approx_super_adjacency" else "M"
+    jobs = []
+    for alpha, N, value in itertools.product(
+        grid(manifest["alpha"]), grid(manifest["N"]), grid(manifest[resolution])
+    ):
+        job = {
+            "map": manifest["map"],
+            "method": method,
+            "alpha": float(alpha),
+            "N": int(N),
+            resolution: int(value),
+            "k": int(manifest.get("k", 6)),
+        }
+        job["key"] = job_key(job)
+        jobs.append(job)
+    return jobs
+
+
+def job_key(job):
+    """
+    Return a file name safe key identifying a job.
+    """
+    resolution = f"depth{job['depth']}" if "depth" in job else f"M{job['M']}"
+    return f"{job['method']}-{job['map']}-{job['alpha']!r}-N{job['N']}-{resolution}"
+
+
+def run_job(job):
+    """
+    Compute the leading eigenvalues of one job.
+
+    Parameters
+    ----------
+    job : dict
+        A job from `expand_manifest`.
+
+    Returns
+    -------
+    record : dict
+        The job with its eigenvalues as [real, imag] pairs, the number of tower
+        domains or Ulam bins, and the wall time in seconds.
+    """
+    start = time.perf_counter()
+    function_domains, functions = MAP_FAMILIES[job["map"]](job["alpha"])
+    if job["method"] == "approx_super_adjacency":
+        A, domains = approx_super_adjacency(
+            function_domains,
+            functions,
+            None,
+            None,
+            job["N"],
+            job["N"],
+            job["depth"],
+            processes=1,
+            return_domains=True,
+        )
+        size = len(domains)
+    else:
+        A = approx_ulams(function_domains, functions, None, None, job["N"], job["M"])
+        size = job["N"]
+    eigenvalues = leading_eigenvalues(A, job["k"])
+
+    return {
+        **job,
+        "eigenvalues": [[float(z.real), float(z.imag)] for z in eigenvalues],
+        "size": size,
+        "time": time.perf_counter() - start,
+    }
+
+
+def try_job(job):
+    """
+    Run a job, recording a failure instead of raising it.
+
+    Parameters
+    ----------
+    job : dict
+        A job from `expand_manifest`.
+
+    Returns
+    -------
+    record : dict
+        The record of `run_job` with "status" "ok", or the job with "status"
+        "failed", the exception as "message" and the wall time in seconds.
+    """
+    start = time.perf_counter()
+    try:
+        record = run_job(job)
+    except Exception as error:
+        return {
+            **job,
+            "status": "failed",
+            "message": f"{type(error).__name__}: {error}",
+            "time": time.perf_counter() - start,
+        }
+    return {**record, "status": "ok"}
+
+
+def write_atomic(path, record):
+    """
+    Write a record as JSON so that the file is either absent or complete.
+
+    The record is written to a temporary file in the same directory, flushed to
+    disk and renamed over the target.
+    """
+    path = Path(path)
+    fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(record, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def completed_keys(output):
+    """
+    Return the keys of the jobs checkpointed in an output directory.
+    """
+    return {path.stem for path in (Path(output) / "jobs").glob("*.json")}
+
+
+def failed_keys(output):
+    """
+    Return the keys of the checkpointed jobs that failed.
+    """
+    keys = set()
+    for path in (Path(output) / "jobs").glob("*.json"):
+        with open(path) as file:
+            if json.load(file).get("status") == "failed":
+                keys.add(path.stem)
+    return keys
+
+
+def run_sweep(manifest, output, workers=1, callback=None, retry_failed=False):
+    """
+    Run the jobs of a manifest, checkpointing each as it finishes.
+
+    The manifest is copied to ``manifest.json`` in the output directory and each
+    finished job is written atomically to ``jobs/<key>.json``. Jobs already
+    checkpointed are skipped, so a sweep interrupted at any point is resumed by
+    running it again with the same output directory. At most `workers` jobs are in
+    flight at a time. A job that raises, for example when ARPACK does not converge,
+    is checkpointed as failed with its message (see `try_job`) and the sweep
+    carries on.
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest (see `expand_manifest`).
+    output : str or Path
+        The output directory.
+    workers : int, optional
+        The number of worker processes. Default is 1, which runs the jobs in the
+        calling process.
+    callback : callable, optional
+        Called with each finished record.
+    retry_failed : bool, optional
+        Whether to run the jobs checkpointed as failed again. Default is False.
+
+    Returns
+    -------
+    n_run : int
+        The number of jobs run, excluding those skipped.
+    """
+    output = Path(output)
+    (output / "jobs").mkdir(parents=True, exist_ok=True)
+    manifest_path = output / "manifest.json"
+    if manifest_path.exists():
+        with open(manifest_path) as file:
+            if json.load(file) != manifest:
+                raise ValueError(f"{output} holds a sweep of a different manifest.")
+    else:
+        write_atomic(manifest_path, manifest)
+
+    done = completed_keys(output)
+    if retry_failed:
+        done -= failed_keys(output)
+    pending = [job for job in expand_manifest(manifest) if job["key"] not in done]
+
+    def finish(record):
+        write_atomic(output / "jobs" / f"{record['key']}.json", record)
+        if callback is not None:
+            callback(record)
+
+    if workers == 1:
+        for job in pending:
+            finish(try_job(job))
+        return len(pending)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = iter(pending)
+        in_flight = set()
+        while True:
+            for job in itertools.islice(jobs, workers - len(in_flight)):
+                in_flight.add(executor.submit(try_job, job))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                finish(future.result())
+
+    return len(pending)
+
+
+def main(argv=None):
+    """
+    Run a sweep manifest from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run a resumable sweep of resonance computations."
+    )
+    parser.add_argument("manifest", help="path of the JSON sweep manifest")
+    parser.add_argument("output", help="directory for the checkpointed results")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="report progress without running"
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="run failed jobs again"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+
+    keys = {job["key"] for job in expand_manifest(manifest)}
+    total = len(keys)
+    failed = keys & failed_keys(args.output)
+    done = len(keys & completed_keys(args.output))
+    if args.status:
+        print(f"{done}/{total} jobs completed, {len(failed)} failed")
+        return
+    if args.retry_failed:
+        done -= len(failed)
+
+    def report(record):
+        nonlocal done
+        done += 1
+        line = f"[{done}/{total}] {record['key']} {record['time']:.2f}s"
+        if record["status"] == "failed":
+            line += f" failed: {record['message']}"
+        print(line, flush=True)
+
+    run_sweep(
+        manifest,
+        args.output,
+        workers=args.workers,
+        callback=report,
+        retry_failed=args.retry_failed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import numpy as np
+
+from .operator_approx import chebyshev_extrema, chebyshev_nodes, linear_map
+
+
+class PullbackOperator:
+    """
+    Transfer operator of a single branch, phi -> phi(g(x)) / |f'(g(x))| with g = f^{-1}.
+
+    Calling the operator on a function returns the transformed function, as the
+    closures from `construct_transfer_operators` used to. In addition the preimages
+    g(x) and weights 1 / |f'(g(x))| at the Chebyshev nodes of a target domain are
+    computed once and stored, so every block with that target domain is a single
+    weighted evaluation of the Chebyshev basis (see `cheb_op_ap_pullback`).
+
+    Tables on a domain are filled from the cached table of the largest order whose
+    nodes are a subset, evaluating the branch only at the new nodes. Second kind
+    nodes are nested when K is multiplied by any integer, in particular doubled,
+    and first kind nodes when it is multiplied by an odd integer, so refining K
+    repeatedly costs about as much as the final K alone. Second kind nodes include
+    the endpoints of the target domain, so they need 1/|f'| to be finite at their
+    preimages; for a smooth map whose critical value is a tower endpoint, such as
+    the logistic map, use first kind nodes.
+
+    Parameters
+    ----------
+    inverse : callable
+        The inverse function of the branch.
+    derivative : callable
+        The derivative function of the branch.
+    nodes : str, optional
+        The kind of Chebyshev nodes, "first" for the K nodes of `chebyshev_nodes`
+        or "second" for the K + 1 nodes of `chebyshev_extrema`. Default is "first".
+    """
+
+    def __init__(self, inverse, derivative, nodes="first"):
+        if nodes not in ("first", "second"):
+            raise ValueError(f"Unknown nodes {nodes!r}, expected 'first' or 'second'.")
+        self.inverse = inverse
+        self.derivative = derivative
+        self.nodes = nodes
+        self.tables = {}
+
+    def __call__(self, phi):
+        return lambda x: phi(self.inverse(x)) / abs(self.derivative(self.inverse(x)))
+
+    def pullback_table(self, final_domain, K):
+        """
+        Return the preimage nodes and weights of the operator on a target domain.
+
+        Parameters
+        ----------
+        final_domain : tuple
+            The target domain of the operator.
+        K : integer
+            The order of the Chebyshev nodes, taken to be the order of the DCT.
+
+        Returns
+        -------
+        preimages : ndarray
+            The preimages of the K Chebyshev nodes of the target domain, or of the
+            K + 1 nodes with second kind nodes.
+        weights : ndarray
+            The weights 1 / |f'| at the preimages.
+        """
+        key = (tuple(final_domain), K)
+        if key in self.tables:
+            return self.tables[key]
+
+        if self.nodes == "first":
+            x = linear_map(chebyshev_nodes(K), final_domain)
+            nested = [k for domain, k in self.tables if domain == key[0]]
+            nested = [k for k in nested if K % k == 0 and (K // k) % 2 == 1]
+        else:
+            x = linear_map(chebyshev_extrema(K), final_domain)
+            nested = [k for domain, k in self.tables if domain == key[0]]
+            nested = [k for k in nested if K % k == 0]
+        if not nested:
+            self.tables[key] = self.evaluate(x)
+            return self.tables[key]
+
+        # Node k of the coarser set is node stride k + offset of this one.
+        stride = K // max(nested)
+        offset = (stride - 1) // 2 if self.nodes == "first" else 0
+        old = np.zeros(len(x), dtype=bool)
+        old[offset::stride] = True
+        preimages, weights = np.empty(len(x)), np.empty(len(x))
+        preimages[old], weights[old] = self.tables[(key[0], max(nested))]
+        preimages[~old], weights[~old] = self.evaluate(x[~old])
+        self.tables[key] = (preimages, weights)
+        return self.tables[key]
+
+    def evaluate(self, x):
+        """
+        Return the preimages of points and the weights 1 / |f'| at the preimages.
+        """
+        preimages = np.asarray(self.inverse(x), dtype=float)
+        weights = 1 / np.abs(self.derivative(preimages))
+        weights = np.broadcast_to(weights, preimages.shape).astype(float)
+        return preimages, weights
+
+
+class ReflectedPullbackOperator(PullbackOperator):
+    """
+    Transfer operator of the branch x -> f(1 - x), derived from the operator of f.
+
+    The preimages of the reflected branch are 1 - g(x) and its weights are those of
+    the partner, so its pullback tables are read off the partner's tables without
+    inverting the branch again.
+
+    Parameters
+    ----------
+    partner : PullbackOperator
+        The transfer operator of the branch f.
+    """
+
+    def __init__(self, partner):
+        self.partner = partner
+        super().__init__(
+            lambda y: 1 - partner.inverse(y),
+            lambda x: -partner.derivative(1 - x),
+            nodes=partner.nodes,
+        )
+
+    def pullback_table(self, final_domain, K):
+        key = (tuple(final_domain), K)
+        if key not in self.tables:
+            preimages, weights = self.partner.pullback_table(final_domain, K)
+            self.tables[key] = (1 - preimages, weights)
+
+        return self.tables[key]
+
+
+def find_reflection_pairs(
+    function_domains, functions, check=True, samples=17, tol=1e-10
+):
+    """
+    Find the branches that are reflections x -> 1 - x of an earlier branch.
+
+    Branch m is the reflection of branch i if its domain is the reflection of the
+    domain of branch i and functions[m](1 - x) = functions[i](x).
+
+    Parameters
+    ----------
+    function_domains : list
+        The list of domains for each segment of the piecewise function.
+    functions : list
+        The list of functions for each segment of the piecewise function.
+    check : bool, optional
+        Whether to check the functions agree at sample points. If False, only the
+        domains are compared, which declares the map symmetric. Default is True.
+    samples : int, optional
+        The number of sample points used in the check. Default is 17.
+    tol : float, optional
+        The tolerance of the check. Default is 1e-10.
+
+    Returns
+    -------
+    pairs : dict
+        Maps the index of each reflected branch to the index of its partner.
+
+    Examples
+    --------
+    >>> find_reflection_pairs([(0, 0.5), (0.5, 1)], [lambda x: 2 * x, lambda x: 2 * (1 - x)])
+    {1: 0}
+    """
+    pairs = {}
+    for m, (domain_m, function_m) in enumerate(zip(function_domains, functions)):
+        for i in range(m):
+            if i in pairs:
+                continue
+            a, b = function_domains[i]
+            if not np.allclose((1 - b, 1 - a), domain_m, atol=tol):
+                continue
+            if check:
+                x = np.linspace(a, b, samples)
+                if not np.allclose(function_m(1 - x), functions[i](x), atol=tol):
+                    continue
+            pairs[m] = i
+            break
+
+    return pairs
+
+
+def reflection_signs(N):
+    """
+    Return the signs (-1)^n that reflect a Chebyshev series under x -> -x.
+
+    Parameters
+    ----------
+    N : integer
+        The order of the Chebyshev polynomials.
+
+    Returns
+    -------
+    signs : ndarray
+        The signs (-1)^n for n = 0, ..., N - 1.
+    """
+    return (-1.0) ** np.arange(N)
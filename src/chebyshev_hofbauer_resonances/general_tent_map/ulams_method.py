@@ -1,12 +1,16 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from scipy.sparse.linalg import eigs
+
+from .out_of_core import ulams_method_out_of_core
 
 """
 Old code repeated.
 """
 
 
-def ulams_method(N, M, f):
+def ulams_method(N, M, f, directory=None):
     """
     Compute Ulam's method approximation of the transfer operator.
 
@@ -18,12 +22,19 @@ def ulams_method(N, M, f):
         The number of sample points per bin.
     f : callable
         The map function to approximate the transfer operator for.
+    directory : str or Path, optional
+        If given, the matrix is built out of core as a sparse matrix in memory
+        mapped files in this directory (see `ulams_method_out_of_core`).
+        Default is None.
 
     Returns
     -------
-    L : ndarray
+    L : ndarray or MemmapCSR
         The Ulam's method approximation matrix of shape (N, N).
     """
+    if directory is not None:
+        return ulams_method_out_of_core(N, M, f, directory)
+
     bins = np.linspace(0, 1, N + 1)
 
     L = np.zeros((N, N))
@@ -42,3 +53,168 @@ def ulams_method(N, M, f):
     L /= L.sum(axis=1, keepdims=True)
 
     return L
+
+
+def sample_ulams_bins(bins, M, f, rows=None):
+    """
+    Sample the bins of a possibly non-uniform partition for Ulam's method.
+
+    Parameters
+    ----------
+    bins : ndarray
+        The increasing bin edges, from 0 to 1.
+    M : int
+        The number of sample points per bin.
+    f : callable
+        The map function. Must accept and return ndarrays.
+    rows : ndarray, optional
+        The indices of the bins to sample. Default is all bins.
+
+    Returns
+    -------
+    images : ndarray
+        Array of shape (len(rows), M) of the images of the samples of each bin.
+    columns : ndarray
+        The bin index of each image.
+    """
+    if rows is None:
+        rows = np.arange(len(bins) - 1)
+    offsets = np.linspace(0, 1, M)
+    widths = bins[rows + 1] - bins[rows]
+    x_samples = bins[rows, None] + widths[:, None] * offsets[None, :]
+    images = f(x_samples.ravel()).reshape(x_samples.shape)
+    columns = np.clip(np.digitize(images, bins) - 1, 0, len(bins) - 2)
+    return images, columns
+
+
+def assemble_ulams(columns):
+    """
+    Assemble the row-stochastic Ulam matrix from the bin index of each sample image.
+
+    Parameters
+    ----------
+    columns : ndarray
+        Array of shape (n, M) of the bin index of each image.
+
+    Returns
+    -------
+    L : csr_matrix
+        The Ulam's method approximation matrix of shape (n, n).
+    """
+    n, M = columns.shape
+    rows = np.repeat(np.arange(n), M)
+    L = csr_matrix((np.full(n * M, 1 / M), (rows, columns.ravel())), shape=(n, n))
+    L.sum_duplicates()
+    return L
+
+
+def leading_eigenvalues(L, k):
+    """
+    Return the k eigenvalues of largest modulus of an Ulam matrix, largest first.
+    """
+    if L.shape[0] <= max(2 * k + 2, 200):
+        eigenvalues = np.linalg.eigvals(L.toarray() if issparse(L) else L)
+    else:
+        eigenvalues = eigs(L, k=k, which="LM", return_eigenvectors=False)
+    return eigenvalues[np.argsort(-np.abs(eigenvalues))][:k]
+
+
+def invariant_masses(L):
+    """
+    Return the invariant measure of each bin, the left eigenvector of eigenvalue 1.
+
+    Eigenvalue 1 has the largest modulus of the stochastic matrix L, so it is found
+    among the leading eigenvalues without factorising the singular L - I. Six are
+    computed, as a map whose attractor is a cycle of p bands, such as the tent map
+    for alpha below sqrt(2), also has the other p-th roots of unity.
+    """
+    if L.shape[0] <= 200:
+        eigenvalues, vectors = np.linalg.eig((L.toarray() if issparse(L) else L).T)
+    else:
+        eigenvalues, vectors = eigs(L.T, k=6, which="LM")
+    masses = np.abs(vectors[:, np.argmin(np.abs(eigenvalues - 1))].real)
+    return masses / masses.sum()
+
+
+def adaptive_ulams_method(
+    M, f, initial_bins=16, max_bins=4096, k=6, tol=1e-3, refine_fraction=0.2
+):
+    """
+    Compute Ulam's method on a partition refined adaptively to the invariant density.
+
+    Starting from a coarse uniform partition, each step estimates the invariant
+    density h from the current matrix and splits the bins with the largest local
+    error indicator, width * |jump in h to a neighbouring bin|, in half. Only the
+    new bins are sampled. The images of existing samples are re-binned with one
+    comparison against the midpoint of the bin they fall in, so the columns of
+    split bins are updated without re-evaluating f. Refinement stops when the k
+    leading eigenvalues change by less than tol, or when the partition has
+    max_bins bins.
+
+    Parameters
+    ----------
+    M : int
+        The number of sample points per bin.
+    f : callable
+        The map function. Must accept and return ndarrays.
+    initial_bins : int, optional
+        The number of bins of the initial uniform partition. Default is 16.
+    max_bins : int, optional
+        The largest number of bins. Default is 4096.
+    k : int, optional
+        The number of leading eigenvalues checked for convergence. Default is 6.
+    tol : float, optional
+        The change in the leading eigenvalues at which refinement stops.
+        Default is 1e-3.
+    refine_fraction : float, optional
+        The fraction of bins split at each step. Default is 0.2.
+
+    Returns
+    -------
+    bins : ndarray
+        The bin edges of the final partition.
+    L : csr_matrix
+        The Ulam's method approximation matrix on the final partition.
+    """
+    bins = np.linspace(0, 1, initial_bins + 1)
+    images, columns = sample_ulams_bins(bins, M, f)
+    L = assemble_ulams(columns)
+    eigenvalues = leading_eigenvalues(L, k)
+
+    while len(bins) - 1 < max_bins:
+        widths = np.diff(bins)
+        density = invariant_masses(L) / widths
+        jumps = np.abs(np.diff(density))
+        error = widths * np.maximum(np.append(jumps, 0), np.insert(jumps, 0, 0))
+
+        n_split = min(
+            max(int(refine_fraction * len(widths)), 1), max_bins - len(widths)
+        )
+        split = np.zeros(len(widths), dtype=bool)
+        split[np.argsort(-error)[:n_split]] = True
+
+        midpoints = (bins[:-1] + bins[1:]) / 2
+        shift = np.cumsum(split) - split
+        upper = split[columns] & (images >= midpoints[columns])
+        columns = columns + shift[columns] + upper
+
+        bins = np.sort(np.concatenate([bins, midpoints[split]]))
+        kept = np.repeat(~split, 1 + split)
+        new_rows = np.nonzero(~kept)[0]
+
+        all_images = np.empty((len(bins) - 1, M))
+        all_columns = np.empty((len(bins) - 1, M), dtype=columns.dtype)
+        all_images[kept] = images[~split]
+        all_columns[kept] = columns[~split]
+        all_images[new_rows], all_columns[new_rows] = sample_ulams_bins(
+            bins, M, f, new_rows
+        )
+        images, columns = all_images, all_columns
+
+        L = assemble_ulams(columns)
+        previous, eigenvalues = eigenvalues, leading_eigenvalues(L, k)
+        change = np.abs(eigenvalues[:, None] - previous[None, :]).min(axis=1).max()
+        if change < tol:
+            break
+
+    return bins, L
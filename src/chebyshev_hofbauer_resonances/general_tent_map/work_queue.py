@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+from .sweep import completed_keys, expand_manifest, failed_keys, try_job, write_atomic
+
+STATES = ("pending", "claimed", "done", "failed")
+
+
+def create_queue(manifests, directory, shard_size=16):
+    """
+    Split the jobs of sweep manifests into shard files of a work queue.
+
+    The queue is a directory on a filesystem shared by the workers, with one
+    subdirectory per state of a shard: ``pending``, ``claimed``, ``done`` and
+    ``failed``. A shard changes state only by being renamed between them, which is
+    atomic, so every shard is held by at most one worker at a time. Results are
+    written to ``jobs`` as in `run_sweep`. Creating a queue that already exists
+    does nothing.
+
+    Parameters
+    ----------
+    manifests : dict or list
+        A sweep manifest (see `expand_manifest`), or a list of them, for example
+        one for approx_super_adjacency and one for approx_ulams.
+    directory : str or Path
+        The queue directory.
+    shard_size : int, optional
+        The number of jobs per shard. Default is 16.
+
+    Returns
+    -------
+    n_shards : int
+        The number of shards of the queue.
+    """
+    directory = Path(directory)
+    if (directory / "manifest.json").exists():
+        return sum(len(list((directory / state).glob("*.json"))) for state in STATES)
+
+    for state in STATES + ("jobs",):
+        (directory / state).mkdir(parents=True, exist_ok=True)
+    if isinstance(manifests, dict):
+        manifests = [manifests]
+    jobs = [job for manifest in manifests for job in expand_manifest(manifest)]
+    shards = [jobs[i : i + shard_size] for i in range(0, len(jobs), shard_size)]
+    for n, shard in enumerate(shards):
+        write_atomic(directory / "pending" / f"shard-{n:06d}.json", shard)
+    write_atomic(directory / "manifest.json", manifests)
+    return len(shards)
+
+
+def shard_id(path):
+    """
+    Return the name of a shard without the worker suffix of a claim or the count
+    of reclaims.
+    """
+    return path.stem.split("--")[0].split(".")[0]
+
+
+def shard_attempts(path):
+    """
+    Return the number of times a shard has been reclaimed from a lost claim.
+    """
+    name = path.stem.split("--")[0]
+    return int(name.split(".")[1]) if "." in name else 0
+
+
+def reclaim_expired(directory, lease, max_attempts=3):
+    """
+    Return claimed shards whose lease has expired to the pending state.
+
+    A claim is renewed by touching its file, so a shard whose file has not been
+    modified for `lease` seconds is held by a dead or stalled worker. The lease
+    should be long compared to the clock skew between nodes. The number of
+    reclaims is kept in the shard name, and a shard whose claims have been lost
+    `max_attempts` times, for example because it crashes every worker, is moved to
+    the failed state instead.
+
+    Returns
+    -------
+    n_reclaimed : int
+        The number of shards returned or failed.
+    """
+    directory = Path(directory)
+    reclaimed = 0
+    for path in (directory / "claimed").glob("*.json"):
+        attempts = shard_attempts(path) + 1
+        if attempts >= max_attempts:
+            target = directory / "failed" / f"{shard_id(path)}.json"
+        else:
+            target = directory / "pending" / f"{shard_id(path)}.{attempts}.json"
+        try:
+            expired = time.time() - path.stat().st_mtime > lease
+            if expired:
+                os.rename(path, target)
+                reclaimed += 1
+        except FileNotFoundError:
+            continue
+    return reclaimed
+
+
+def claim_shard(directory, worker_id, lease, max_attempts=3):
+    """
+    Claim a pending shard by renaming it into the claimed state.
+
+    Expired claims are returned to the pending state first (see
+    `reclaim_expired`). If another worker renames a shard first this worker's
+    rename fails and it tries the next one.
+
+    Returns
+    -------
+    path : Path or None
+        The claimed shard file, or None if no shard is pending.
+    """
+    directory = Path(directory)
+    reclaim_expired(directory, lease, max_attempts)
+    for path in sorted((directory / "pending").glob("*.json")):
+        claimed = directory / "claimed" / f"{path.stem}--{worker_id}.json"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+        os.utime(claimed)
+        return claimed
+    return None
+
+
+class Lease:
+    """
+    Renew the claim on a shard from a background thread while it is processed.
+
+    The claim file is touched every third of the lease. If it has disappeared,
+    because the lease expired and another worker reclaimed it, `lost` is set.
+    """
+
+    def __init__(self, path, lease):
+        self.path = path
+        self.interval = lease / 3
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.renew, daemon=True)
+
+    def renew(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_worker(
+    directory, worker_id=None, lease=600.0, wait=True, poll=5.0, max_attempts=3
+):
+    """
+    Claim and run shards of a work queue until it is finished.
+
+    Jobs already checkpointed, for example by a worker whose lease expired, are
+    skipped. A job that raises is checkpointed as failed (see `try_job`), so it
+    does not stop the worker. A finished shard is renamed into the done state.
+    When no shard is pending but some are claimed by other workers, the worker
+    waits for them to finish or for their leases to expire, unless `wait` is
+    False.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The queue directory (see `create_queue`).
+    worker_id : str, optional
+        The name of the worker. Default is the host name and process id.
+    lease : float, optional
+        The lease in seconds after which a claim not renewed is reclaimed.
+        Default is 600.
+    wait : bool, optional
+        Whether to wait for shards claimed by other workers. Default is True.
+    poll : float, optional
+        The interval in seconds between checks while waiting. Default is 5.
+    max_attempts : int, optional
+        The number of lost claims after which a shard is failed rather than
+        reclaimed. Default is 3.
+
+    Returns
+    -------
+    n_jobs : int
+        The number of jobs this worker ran.
+    """
+    directory = Path(directory)
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    n_jobs = 0
+    while True:
+        path = claim_shard(directory, worker_id, lease, max_attempts)
+        if path is None:
+            if wait and any((directory / "claimed").glob("*.json")):
+                time.sleep(poll)
+                continue
+            return n_jobs
+
+        with open(path) as file:
+            shard = json.load(file)
+        with Lease(path, lease) as claim:
+            done = completed_keys(directory)
+            for job in shard:
+                if claim.lost:
+                    break
+                if job["key"] in done:
+                    continue
+                record = try_job(job)
+                write_atomic(directory / "jobs" / f"{job['key']}.json", record)
+                n_jobs += 1
+        if not claim.lost:
+            try:
+                os.rename(path, directory / "done" / f"{shard_id(path)}.json")
+            except FileNotFoundError:
+                pass
+
+
+def queue_status(directory):
+    """
+    Return the number of shards in each state, and of finished and failed jobs.
+    """
+    directory = Path(directory)
+    status = {state: len(list((directory / state).glob("*.json"))) for state in STATES}
+    status["jobs"] = len(completed_keys(directory))
+    status["failed_jobs"] = len(failed_keys(directory))
+    return status
+
+
+def main(argv=None):
+    """
+    Create, work on or inspect a sweep work queue from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description="Shard a sweep over workers through a shared directory."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="split a manifest into shards")
+    create.add_argument("manifest", help="path of the JSON manifest or list of them")
+    create.add_argument("directory", help="the queue directory")
+    create.add_argument("--shard-size", type=int, default=16)
+    work = commands.add_parser("work", help="run shards until the queue is done")
+    work.add_argument("directory", help="the queue directory")
+    work.add_argument("--worker-id")
+    work.add_argument("--lease", type=float, default=600.0, help="lease in seconds")
+    work.add_argument("--no-wait", action="store_true")
+    work.add_argument(
+        "--max-attempts", type=int, default=3, help="lost claims before a shard fails"
+    )
+    status = commands.add_parser("status", help="count shards in each state")
+    status.add_argument("directory", help="the queue directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        with open(args.manifest) as file:
+            manifests = json.load(file)
+        print(f"{create_queue(manifests, args.directory, args.shard_size)} shards")
+    elif args.command == "work":
+        n_jobs = run_worker(
+            args.directory,
+            args.worker_id,
+            args.lease,
+            wait=not args.no_wait,
+            max_attempts=args.max_attempts,
+        )
+        print(f"{n_jobs} jobs run")
+    else:
+        print(json.dumps(queue_status(args.directory)))
+
+
+if __name__ == "__main__":
+    main()